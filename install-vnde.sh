@@ -132,6 +132,10 @@ install_shared_files() {
 
   run_cmd "cp \"$ROOT_DIR/vnde/gui/vn_app_center.py\" \"$HOME/.local/share/vnde/gui/vn_app_center.py\""
   run_cmd "cp \"$ROOT_DIR/vnde/gui/vn_news_center.py\" \"$HOME/.local/share/vnde/gui/vn_news_center.py\""
+  run_cmd "cp \"$ROOT_DIR/vnde/gui/vn_news_service.py\" \"$HOME/.local/share/vnde/gui/vn_news_service.py\""
+  run_cmd "cp \"$ROOT_DIR/vnde/gui/vn_news_article.py\" \"$HOME/.local/share/vnde/gui/vn_news_article.py\""
+  run_cmd "cp \"$ROOT_DIR/vnde/gui/vn_text.py\" \"$HOME/.local/share/vnde/gui/vn_text.py\""
+  run_cmd "cp \"$ROOT_DIR/vnde/gui/vn_power.py\" \"$HOME/.local/share/vnde/gui/vn_power.py\""
   run_cmd "cp \"$ROOT_DIR/vnde/gui/vn_music_center.py\" \"$HOME/.local/share/vnde/gui/vn_music_center.py\""
   run_cmd "cp \"$ROOT_DIR/vnde/gui/vn_menu_center.py\" \"$HOME/.local/share/vnde/gui/vn_menu_center.py\""
   run_cmd "cp \"$ROOT_DIR/vnde/gui/vn_file_manager.py\" \"$HOME/.local/share/vnde/gui/vn_file_manager.py\""
@@ -167,7 +171,7 @@ install_shared_files() {
   run_cmd "cp \"$ROOT_DIR/vnde/scripts/vnde-gnome-panel\" \"$HOME/.local/bin/vnde-gnome-panel\""
   run_cmd "cp \"$ROOT_DIR/vnde/tint2/tint2rc\" \"$HOME/.config/vnde/tint2/tint2rc\""
 
-  run_cmd "chmod +x \"$HOME/.local/share/vnde/gui/vn_app_center.py\" \"$HOME/.local/share/vnde/gui/vn_news_center.py\" \"$HOME/.local/share/vnde/gui/vn_music_center.py\" \"$HOME/.local/share/vnde/gui/vn_menu_center.py\" \"$HOME/.local/share/vnde/gui/vn_file_manager.py\" \"$HOME/.local/share/vnde/gui/vn_helper_center.py\" \"$HOME/.local/share/vnde/gui/vn_supports_center.py\" \"$HOME/.local/share/vnde/gui/vn_setting_center.py\" \"$HOME/.local/share/vnde/gui/vn_monitor_center.py\" \"$HOME/.local/share/vnde/gui/vn_forum_center.py\" \"$HOME/.local/share/vnde/gui/vn_forum_node.py\" \"$HOME/.local/share/vnde/gui/vn_docker_center.py\""
+  run_cmd "chmod +x \"$HOME/.local/share/vnde/gui/vn_app_center.py\" \"$HOME/.local/share/vnde/gui/vn_news_center.py\" \"$HOME/.local/share/vnde/gui/vn_news_service.py\" \"$HOME/.local/share/vnde/gui/vn_music_center.py\" \"$HOME/.local/share/vnde/gui/vn_menu_center.py\" \"$HOME/.local/share/vnde/gui/vn_file_manager.py\" \"$HOME/.local/share/vnde/gui/vn_helper_center.py\" \"$HOME/.local/share/vnde/gui/vn_supports_center.py\" \"$HOME/.local/share/vnde/gui/vn_setting_center.py\" \"$HOME/.local/share/vnde/gui/vn_monitor_center.py\" \"$HOME/.local/share/vnde/gui/vn_forum_center.py\" \"$HOME/.local/share/vnde/gui/vn_forum_node.py\" \"$HOME/.local/share/vnde/gui/vn_docker_center.py\""
   run_cmd "chmod +x \"$HOME/.local/bin/vn-app-store\" \"$HOME/.local/bin/vn-news\" \"$HOME/.local/bin/vn-music\" \"$HOME/.local/bin/vn-menu\" \"$HOME/.local/bin/vn-terminal\" \"$HOME/.local/bin/vn-helper\" \"$HOME/.local/bin/vn-supports\" \"$HOME/.local/bin/vn-setting\" \"$HOME/.local/bin/vn-monitor\" \"$HOME/.local/bin/vn-forum\" \"$HOME/.local/bin/vn-docker\" \"$HOME/.local/bin/vn-terminal-context-menu\" \"$HOME/.local/bin/menu\" \"$HOME/.local/bin/vn-file-manager\" \"$HOME/.local/bin/vn-sound-popup\" \"$HOME/.local/bin/vn-news-cli\" \"$HOME/.local/bin/vn-news-panel\" \"$HOME/.local/bin/vnde-install\" \"$HOME/.local/bin/vnde-update\" \"$HOME/.local/bin/vnde\" \"$HOME/.local/bin/vnde-bootstrap\" \"$HOME/.local/bin/vnde-gnome-panel\""
   run_cmd "sudo install -Dm755 \"$HOME/.local/bin/vnde-install\" /usr/local/bin/vnde-install || true"
   run_cmd "sudo install -Dm755 \"$HOME/.local/bin/vnde-update\" /usr/local/bin/vnde-update || true"
@@ -1,4 +1,7 @@
 #!/usr/bin/env python3
+import functools
+import json
+import os
 import shutil
 import subprocess
 import threading
@@ -9,15 +12,33 @@ gi.require_version("Gtk", "4.0")
 from gi.repository import Gdk, GLib, Gtk
 
 APPS = [
-    {"id": "firefox", "name": "Firefox", "desc": "Trinh duyet web", "native": "firefox", "launch": "firefox", "icon": "firefox"},
-    {"id": "chrome", "name": "Google Chrome", "desc": "Trinh duyet Google", "native": "google-chrome-stable", "launch": "google-chrome-stable", "icon": "google-chrome"},
-    {"id": "vlc", "name": "VLC", "desc": "Xem video va nghe nhac", "native": "vlc", "launch": "vlc", "icon": "vlc"},
-    {"id": "libreoffice", "name": "LibreOffice", "desc": "Bo ung dung van phong", "native": "libreoffice", "launch": "libreoffice", "icon": "libreoffice-startcenter"},
-    {"id": "telegram", "name": "Telegram", "desc": "Nhan tin", "native": "telegram-desktop", "launch": "telegram-desktop", "icon": "telegram"},
-    {"id": "vscode", "name": "VS Code", "desc": "Lap trinh", "native": "code", "launch": "code", "icon": "code"},
-    {"id": "gimp", "name": "GIMP", "desc": "Sua anh", "native": "gimp", "launch": "gimp", "icon": "gimp"},
-    {"id": "obs", "name": "OBS Studio", "desc": "Quay man hinh", "native": "obs-studio", "launch": "obs", "icon": "com.obsproject.Studio"},
-    {"id": "docker", "name": "Docker", "desc": "Nen tang container", "native": "docker.io", "launch": "vn-terminal -e 'docker ps'", "icon": "vnde-docker"},
+    {"id": "firefox", "name": "Firefox", "desc": "Trinh duyet web", "native": "firefox", "flatpak": "org.mozilla.firefox", "snap": "firefox", "launch": "firefox", "icon": "firefox"},
+    {"id": "chrome", "name": "Google Chrome", "desc": "Trinh duyet Google", "native": "google-chrome-stable", "flatpak": "com.google.Chrome", "launch": "google-chrome-stable", "icon": "google-chrome"},
+    {"id": "vlc", "name": "VLC", "desc": "Xem video va nghe nhac", "native": "vlc", "flatpak": "org.videolan.VLC", "snap": "vlc", "launch": "vlc", "icon": "vlc"},
+    {"id": "libreoffice", "name": "LibreOffice", "desc": "Bo ung dung van phong", "native": "libreoffice", "flatpak": "org.libreoffice.LibreOffice", "snap": "libreoffice", "launch": "libreoffice", "icon": "libreoffice-startcenter"},
+    {"id": "telegram", "name": "Telegram", "desc": "Nhan tin", "native": "telegram-desktop", "flatpak": "org.telegram.desktop", "snap": "telegram-desktop", "launch": "telegram-desktop", "icon": "telegram"},
+    {"id": "vscode", "name": "VS Code", "desc": "Lap trinh", "native": "code", "flatpak": "com.visualstudio.code", "snap": "code", "launch": "code", "icon": "code"},
+    {"id": "gimp", "name": "GIMP", "desc": "Sua anh", "native": "gimp", "flatpak": "org.gimp.GIMP", "snap": "gimp", "launch": "gimp", "icon": "gimp"},
+    {"id": "obs", "name": "OBS Studio", "desc": "Quay man hinh", "native": "obs-studio", "flatpak": "com.obsproject.Studio", "snap": "obs-studio", "launch": "obs", "icon": "com.obsproject.Studio"},
+    {"id": "docker", "name": "Docker", "desc": "Nen tang container", "native": "docker.io", "snap": "docker", "launch": "vn-terminal -e 'docker ps'", "icon": "vnde-docker"},
+]
+
+INVENTORY_CACHE = os.path.expanduser("~/.cache/vnde/app-inventory.json")
+# Anything that changes when packages are installed, removed or new versions become known.
+# rpm and flatpak update files in place, so their files are listed rather than the directories.
+PACKAGE_DBS = [
+    "/var/lib/dpkg/status",
+    "/var/lib/apt/lists",
+    "/var/lib/rpm",
+    "/var/lib/rpm/rpmdb.sqlite",
+    "/var/lib/rpm/Packages",
+    "/var/cache/dnf",
+    "/var/cache/zypp/solv",
+    "/var/lib/pacman/local",
+    "/var/lib/pacman/sync",
+    "/var/lib/flatpak/.changed",
+    os.path.expanduser("~/.local/share/flatpak/.changed"),
+    "/var/lib/snapd/state.json",
 ]
 
 CSS = """
@@ -30,6 +51,9 @@ window { background: #0f1115; }
 .app-title { font-size: 18px; font-weight: 750; }
 .muted { color: #b9bfca; }
 .searchbox { border-radius: 12px; }
+.badge { border-radius: 8px; padding: 2px 8px; font-size: 12px; font-weight: 700; background: #2d3442; color: #d5dae3; }
+.badge-installed { background: #163522; color: #9ff0bd; }
+.badge-update { background: #5a3b08; color: #ffd27a; }
 """
 
 
@@ -41,6 +65,7 @@ def apply_css():
     )
 
 
+@functools.lru_cache(maxsize=None)
 def detect_pm():
     for pm in ("apt-get", "dnf", "pacman", "zypper"):
         if shutil.which(pm):
@@ -48,19 +73,159 @@ def detect_pm():
     return ""
 
 
-def install_cmd(app):
+def install_cmd(app, upgrade=False):
     pm = detect_pm()
     if pm == "apt-get":
-        return f"apt-get update && apt-get install -y {app['native']}"
+        extra = "--only-upgrade " if upgrade else ""
+        return f"apt-get update && apt-get install -y {extra}{app['native']}"
     if pm == "dnf":
-        return f"dnf install -y {app['native']}"
+        return f"dnf {'upgrade' if upgrade else 'install'} -y {app['native']}"
     if pm == "pacman":
         return f"pacman -Sy --noconfirm {app['native']}"
     if pm == "zypper":
-        return f"zypper install -y {app['native']}"
+        return f"zypper {'update' if upgrade else 'install'} -y {app['native']}"
     return ""
 
 
+def run_query(cmd):
+    # One batch query; a missing or failing tool just contributes nothing.
+    if not shutil.which(cmd[0]):
+        return ""
+    try:
+        return subprocess.run(cmd, capture_output=True, text=True, timeout=120).stdout
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def native_versions(names):
+    found = {}
+    if shutil.which("dpkg-query"):
+        out = run_query(["dpkg-query", "-W", "-f", "${Package}\t${Version}\t${db:Status-Abbrev}\n"] + names)
+        for line in out.splitlines():
+            parts = line.split("\t")
+            if len(parts) == 3 and parts[2].startswith("ii"):
+                found[parts[0]] = parts[1]
+    elif shutil.which("rpm"):
+        for line in run_query(["rpm", "-q", "--qf", "%{NAME}\t%{VERSION}-%{RELEASE}\n"] + names).splitlines():
+            parts = line.split("\t")
+            if len(parts) == 2:
+                found[parts[0]] = parts[1]
+    elif shutil.which("pacman"):
+        for line in run_query(["pacman", "-Q"] + names).splitlines():
+            parts = line.split()
+            if len(parts) == 2:
+                found[parts[0]] = parts[1]
+    return found
+
+
+def native_updates(names):
+    # Newer versions the local package metadata already knows about; never touches the network.
+    wanted = set(names)
+    found = {}
+    pm = detect_pm()
+    if pm == "apt-get":
+        # "vlc/noble-updates 3.0.21-1 amd64 [upgradable from: 3.0.20-3]"
+        for line in run_query(["apt", "list", "--upgradable"]).splitlines():
+            parts = line.split()
+            if len(parts) >= 2 and "/" in parts[0]:
+                found[parts[0].split("/", 1)[0]] = parts[1]
+    elif pm == "dnf":
+        # "vlc.x86_64    1:3.0.21-1.fc40    rpmfusion-free-updates"
+        for line in run_query(["dnf", "-q", "-C", "check-update"]).splitlines():
+            parts = line.split()
+            if len(parts) == 3 and "." in parts[0]:
+                found[parts[0].rsplit(".", 1)[0]] = parts[1]
+    elif pm == "pacman":
+        # "vlc 3.0.20-1 -> 3.0.21-1"
+        for line in run_query(["pacman", "-Qu"]).splitlines():
+            parts = line.split()
+            if len(parts) >= 4 and parts[2] == "->":
+                found[parts[0]] = parts[3]
+    elif pm == "zypper":
+        # "v | repo | vlc | 3.0.20-1.1 | 3.0.21-1.1 | x86_64"
+        for line in run_query(["zypper", "--no-refresh", "-q", "list-updates"]).splitlines():
+            parts = [p.strip() for p in line.split("|")]
+            if len(parts) >= 5 and parts[0] == "v":
+                found[parts[2]] = parts[4]
+    return {name: version for name, version in found.items() if name in wanted}
+
+
+def flatpak_versions():
+    found = {}
+    for line in run_query(["flatpak", "list", "--app", "--columns=application,version"]).splitlines():
+        parts = line.split("\t")
+        if parts and parts[0]:
+            found[parts[0]] = parts[1] if len(parts) > 1 else ""
+    return found
+
+
+def snap_versions():
+    found = {}
+    for line in run_query(["snap", "list"]).splitlines()[1:]:
+        parts = line.split()
+        if len(parts) >= 2:
+            found[parts[0]] = parts[1]
+    return found
+
+
+def query_inventory():
+    # A handful of subprocesses in total, however many apps are listed.
+    names = [app["native"] for app in APPS if app.get("native")]
+    versions = native_versions(names)
+    updates = native_updates(list(versions))
+    wanted_flatpak = {app["flatpak"] for app in APPS if app.get("flatpak")}
+    wanted_snap = {app["snap"] for app in APPS if app.get("snap")}
+    return {
+        "native": {name: {"version": version, "update": updates.get(name, "")} for name, version in versions.items()},
+        "flatpak": {k: v for k, v in flatpak_versions().items() if k in wanted_flatpak},
+        "snap": {k: v for k, v in snap_versions().items() if k in wanted_snap},
+    }
+
+
+def inventory_key():
+    stamps = []
+    for path in PACKAGE_DBS:
+        try:
+            stamps.append([path, os.stat(path).st_mtime_ns])
+        except OSError:
+            continue
+    apps = [[app["id"], app.get("native", ""), app.get("flatpak", ""), app.get("snap", "")] for app in APPS]
+    return {"dbs": stamps, "apps": apps}
+
+
+def load_inventory():
+    # Reuse the last inventory while no package database has changed since it was taken.
+    key = inventory_key()
+    try:
+        with open(INVENTORY_CACHE, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("key") == key:
+            return cached["inventory"]
+    except (OSError, ValueError, KeyError):
+        pass
+    inventory = query_inventory()
+    try:
+        os.makedirs(os.path.dirname(INVENTORY_CACHE), exist_ok=True)
+        tmp = f"{INVENTORY_CACHE}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "inventory": inventory}, f)
+        os.replace(tmp, INVENTORY_CACHE)
+    except OSError:
+        pass
+    return inventory
+
+
+def app_status(app, inventory):
+    # None when not installed, else {"source", "version", "update"}; native packages win.
+    native = inventory["native"].get(app.get("native", ""))
+    if native is not None:
+        return {"source": "native", "version": native["version"], "update": native["update"]}
+    for source in ("flatpak", "snap"):
+        if app.get(source) in inventory[source]:
+            return {"source": source, "version": inventory[source][app[source]], "update": ""}
+    return None
+
+
 def run_root(cmd):
     if shutil.which("pkexec"):
         return subprocess.run(["pkexec", "sh", "-lc", cmd], capture_output=True, text=True)
@@ -72,6 +237,7 @@ class AppCard(Gtk.Box):
         super().__init__(orientation=Gtk.Orientation.VERTICAL, spacing=12)
         self.app = app
         self.parent = parent
+        self.state = None
         self.add_css_class("card")
         self.set_size_request(320, 220)
 
@@ -85,19 +251,27 @@ class AppCard(Gtk.Box):
         desc = Gtk.Label(label=app["desc"], xalign=0)
         desc.add_css_class("muted")
         desc.set_wrap(True)
+        self.badge = Gtk.Label(label="Dang kiem tra...", xalign=0)
+        self.badge.set_halign(Gtk.Align.START)
+        self.badge.add_css_class("badge")
+        self.version = Gtk.Label(label="", xalign=0)
+        self.version.add_css_class("muted")
+        self.version.set_visible(False)
         text_box.append(title)
         text_box.append(desc)
+        text_box.append(self.badge)
+        text_box.append(self.version)
 
         actions = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
         actions.set_halign(Gtk.Align.END)
         actions.set_hexpand(True)
-        btn_install = Gtk.Button(label="Cai dat")
-        btn_install.add_css_class("suggested-action")
-        btn_install.connect("clicked", self.on_install)
-        btn_open = Gtk.Button(label="Mo")
-        btn_open.connect("clicked", self.on_open)
-        actions.append(btn_install)
-        actions.append(btn_open)
+        self.btn_install = Gtk.Button(label="Cai dat")
+        self.btn_install.add_css_class("suggested-action")
+        self.btn_install.connect("clicked", self.on_install)
+        self.btn_open = Gtk.Button(label="Mo")
+        self.btn_open.connect("clicked", self.on_open)
+        actions.append(self.btn_install)
+        actions.append(self.btn_open)
 
         top.append(icon)
         top.append(text_box)
@@ -105,11 +279,39 @@ class AppCard(Gtk.Box):
         self.append(top)
         self.append(actions)
 
+    def set_state(self, state):
+        self.state = state
+        if state is None:
+            self.badge.set_label("Chua cai")
+            self.badge.set_css_classes(["badge"])
+            self.version.set_visible(False)
+            self.btn_install.set_label("Cai dat")
+            self.btn_install.set_visible(True)
+            self.btn_open.set_sensitive(False)
+            return
+        where = "" if state["source"] == "native" else f" ({state['source']})"
+        version = f"Phien ban {state['version']}" if state["version"] else "Khong ro phien ban"
+        if state["update"]:
+            self.badge.set_label("Co ban cap nhat")
+            self.badge.set_css_classes(["badge", "badge-update"])
+            version += f" -> {state['update']}"
+        else:
+            self.badge.set_label("Da cai" + where)
+            self.badge.set_css_classes(["badge", "badge-installed"])
+        self.version.set_label(version)
+        self.version.set_visible(True)
+        self.btn_install.set_label("Cap nhat")
+        self.btn_install.set_visible(bool(state["update"]))
+        self.btn_open.set_sensitive(True)
+
     def on_open(self, _btn):
+        if self.state and self.state["source"] == "flatpak":
+            subprocess.Popen(["flatpak", "run", self.app["flatpak"]])
+            return
         subprocess.Popen(["sh", "-lc", self.app["launch"]])
 
     def on_install(self, _btn):
-        self.parent.install(self.app)
+        self.parent.install(self.app, upgrade=bool(self.state and self.state["update"]))
 
 
 class VNAppCenter(Gtk.Application):
@@ -164,7 +366,14 @@ class VNAppCenter(Gtk.Application):
         root.append(sc)
         self.win.set_child(root)
 
-        self.render()
+        # Cards are built once; search only filters them and the inventory updates them in place.
+        self.cards = []
+        for app in APPS:
+            card = AppCard(app, self)
+            self.cards.append(card)
+            self.flow.insert(card, -1)
+        self.flow.set_filter_func(self.filter_card)
+        self.refresh_inventory()
         self.win.maximize()
         self.win.present()
 
@@ -172,25 +381,31 @@ class VNAppCenter(Gtk.Application):
         self.status.set_label(msg)
 
     def render(self, *_):
+        self.flow.invalidate_filter()
+
+    def filter_card(self, child):
         term = self.search.get_text().strip().lower()
-        child = self.flow.get_first_child()
-        while child is not None:
-            nxt = child.get_next_sibling()
-            self.flow.remove(child)
-            child = nxt
+        app = child.get_child().app
+        return not term or term in f"{app['id']} {app['name']} {app['desc']}".lower()
 
-        for app in APPS:
-            blob = f"{app['id']} {app['name']} {app['desc']}".lower()
-            if term and term not in blob:
-                continue
-            self.flow.insert(AppCard(app, self), -1)
+    def refresh_inventory(self):
+        def worker():
+            inventory = load_inventory()
+            GLib.idle_add(self.apply_inventory, inventory)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def apply_inventory(self, inventory):
+        for card in self.cards:
+            card.set_state(app_status(card.app, inventory))
+        return False
 
-    def install(self, app):
-        cmd = install_cmd(app)
+    def install(self, app, upgrade=False):
+        cmd = install_cmd(app, upgrade)
         if not cmd:
             self.set_status("Khong xac dinh duoc package manager")
             return
-        self.set_status(f"Dang cai {app['name']}...")
+        self.set_status(f"Dang {'cap nhat' if upgrade else 'cai'} {app['name']}...")
 
         def worker():
             p = run_root(cmd)
@@ -199,6 +414,8 @@ class VNAppCenter(Gtk.Application):
             else:
                 msg = (p.stderr or p.stdout or "Cai dat that bai").strip().splitlines()[-1]
             GLib.idle_add(self.set_status, msg)
+            # The package database changed, so this re-queries instead of hitting the cache.
+            self.refresh_inventory()
 
         threading.Thread(target=worker, daemon=True).start()
 
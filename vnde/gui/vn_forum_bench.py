@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+# Load test for vn_forum_node.py: runs N nodes on loopback and writes the numbers to a JSON file.
+#
+#   python3 vn_forum_bench.py --nodes 4 --posts 2000 --image-fraction 0.2 --out before.json
+#   python3 vn_forum_bench.py --nodes 4 --posts 2000 --image-fraction 0.2 --compare before.json
+import argparse
+import base64
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import string
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+NODE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vn_forum_node.py")
+START_TIMEOUT = 15
+PROXY_CHUNK = 64 * 1024
+WORDS = [
+    "tin", "tuc", "ha", "noi", "sai", "gon", "da", "nang", "cong", "nghe", "linux", "mang",
+    "may", "chu", "dien", "dan", "chia", "se", "kinh", "nghiem", "phan", "mem", "cai", "dat",
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def latency_stats(samples, elapsed, count, nbytes):
+    return {
+        "requests": len(samples),
+        "items": count,
+        "seconds": round(elapsed, 4),
+        "items_per_s": round(count / elapsed, 1) if elapsed else 0.0,
+        "mb_per_s": round(nbytes / elapsed / 1e6, 3) if elapsed else 0.0,
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2) if samples else 0.0,
+    }
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_kb(pid):
+    # (current, peak) resident set size from /proc; zeros where that isn't available.
+    cur = peak = 0
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    cur = int(line.split()[1])
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1])
+    except OSError:
+        pass
+    return cur, peak
+
+
+def make_corpus(count, body_bytes, image_fraction, image_bytes, seed):
+    rng = random.Random(seed)
+    now = int(time.time())
+    posts = []
+    for i in range(count):
+        words = []
+        size = 0
+        while size < body_bytes:
+            w = rng.choice(WORDS)
+            words.append(w)
+            size += len(w) + 1
+        post = {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "title": " ".join(rng.choice(WORDS) for _ in range(6)),
+            "body": " ".join(words)[:body_bytes],
+            "author": "bench" + "".join(rng.choice(string.ascii_lowercase) for _ in range(3)),
+            "created_ts": now - count + i,
+            "reactions": {"like": rng.randint(0, 20), "love": 0, "haha": 0},
+            "comments": [],
+        }
+        if rng.random() < image_fraction:
+            raw = rng.getrandbits(image_bytes * 8).to_bytes(image_bytes, "little")
+            post["image_b64"] = base64.b64encode(raw).decode("ascii")
+            post["image_name"] = f"bench-{i}.bin"
+        posts.append(post)
+    return posts
+
+
+class CountingProxy:
+    # TCP relay in front of a node so node-to-node sync traffic can be counted.
+    def __init__(self, target_port):
+        self.target_port = target_port
+        self.port = free_port()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", self.port))
+        self.sock.listen(64)
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+
+    def accept_loop(self):
+        while True:
+            try:
+                client, _addr = self.sock.accept()
+            except OSError:
+                return
+            try:
+                upstream = socket.create_connection(("127.0.0.1", self.target_port), timeout=5)
+                upstream.settimeout(None)
+            except OSError:
+                client.close()
+                continue
+            threading.Thread(target=self.pipe, args=(client, upstream), daemon=True).start()
+            threading.Thread(target=self.pipe, args=(upstream, client), daemon=True).start()
+
+    def pipe(self, src, dst):
+        try:
+            while True:
+                data = src.recv(PROXY_CHUNK)
+                if not data:
+                    break
+                with self.lock:
+                    self.bytes += len(data)
+                dst.sendall(data)
+        except OSError:
+            pass
+        finally:
+            for s in (src, dst):
+                try:
+                    s.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def take(self):
+        with self.lock:
+            n, self.bytes = self.bytes, 0
+        return n
+
+
+class Node:
+    def __init__(self, root, index, sync_interval):
+        self.index = index
+        self.port = free_port()
+        self.proxy = CountingProxy(self.port)
+        self.data_dir = os.path.join(root, f"node{index}")
+        self.sync_interval = sync_interval
+        self.proc = None
+
+    def start(self, seeds):
+        env = dict(os.environ)
+        env.update(
+            {
+                "VNFORUM_DATA_DIR": self.data_dir,
+                "VNFORUM_PORT": str(self.port),
+                "VNFORUM_ADVERTISE_PORT": str(self.proxy.port),
+                "VNFORUM_DISCOVERY_PORT": "0",
+                "VNFORUM_SYNC_INTERVAL": str(self.sync_interval),
+                "VNFORUM_SEEDS": ",".join(seeds),
+            }
+        )
+        self.proc = subprocess.Popen(
+            [sys.executable, NODE_SCRIPT], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = time.time() + START_TIMEOUT
+        while time.time() < deadline:
+            try:
+                self.get("/status")
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError(f"node {self.index} did not start on port {self.port}")
+
+    def stop(self):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+    def request(self, method, path, body=None):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+        try:
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+            if resp.status >= 400:
+                raise OSError(f"{method} {path}: HTTP {resp.status}")
+            return data
+        finally:
+            conn.close()
+
+    def get(self, path):
+        return json.loads(self.request("GET", path).decode("utf-8"))
+
+    def root(self):
+        return self.get("/digest").get("root")
+
+    def rss(self):
+        return rss_kb(self.proc.pid) if self.proc is not None else (0, 0)
+
+
+class Client:
+    # One keep-alive connection per worker thread, like a real peer or GUI.
+    def __init__(self, port):
+        self.port = port
+        self.local = threading.local()
+
+    def call(self, method, path, body=None):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        t0 = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self.local.conn = None
+            raise
+        elapsed = time.perf_counter() - t0
+        if resp.status >= 400:
+            raise OSError(f"{method} {path}: HTTP {resp.status}")
+        return elapsed, data
+
+
+def bench_merge(node, corpus, batch, clients):
+    client = Client(node.port)
+    batches = [json.dumps(corpus[i : i + batch]).encode("utf-8") for i in range(0, len(corpus), batch)]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        samples = [elapsed for elapsed, _data in pool.map(lambda b: client.call("POST", "/merge", b), batches)]
+    elapsed = time.perf_counter() - t0
+    return latency_stats(samples, elapsed, len(corpus), sum(len(b) for b in batches))
+
+
+def bench_posts(node, page_size, requests, clients):
+    # Random page reads: collect the cursors first, then hammer them concurrently.
+    cursors = [""]
+    while True:
+        page = node.get(f"/posts?limit={page_size}" + (f"&cursor={cursors[-1]}" if cursors[-1] else ""))
+        if not page.get("next_cursor"):
+            break
+        cursors.append(urllib.parse.quote(page["next_cursor"]))
+    client = Client(node.port)
+    paths = []
+    for _ in range(requests):
+        cursor = random.choice(cursors)
+        paths.append(f"/posts?limit={page_size}" + (f"&cursor={cursor}" if cursor else ""))
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(lambda p: client.call("GET", p), paths))
+    elapsed = time.perf_counter() - t0
+    full_t0 = time.perf_counter()
+    full = node.request("GET", "/posts")
+    full_elapsed = time.perf_counter() - full_t0
+    stats = latency_stats([r[0] for r in results], elapsed, requests * page_size, sum(len(r[1]) for r in results))
+    stats["pages"] = len(cursors)
+    stats["full_dump_ms"] = round(full_elapsed * 1000, 2)
+    stats["full_dump_bytes"] = len(full)
+    return stats
+
+
+def bench_sync(nodes, timeout, settle_rounds, idle_rounds):
+    # Cold join: every other node starts empty, seeded with its neighbour, and we wait for equal roots.
+    source = nodes[0]
+    target = source.root()
+    for node in nodes:
+        node.proxy.take()
+    t0 = time.perf_counter()
+    for i, node in enumerate(nodes[1:], 1):
+        node.start([f"127.0.0.1:{nodes[i - 1].proxy.port}"])
+    converged = None
+    while time.perf_counter() - t0 < timeout:
+        if all(node.root() == target for node in nodes[1:]):
+            converged = time.perf_counter() - t0
+            break
+        time.sleep(0.05)
+    # Let in-flight rounds finish (peers pulling back each other's change logs) before idling.
+    interval = nodes[0].sync_interval
+    time.sleep(interval * settle_rounds)
+    join_bytes = sum(node.proxy.take() for node in nodes)
+    time.sleep(interval * idle_rounds)
+    idle_bytes = sum(node.proxy.take() for node in nodes)
+    return {
+        "converged": converged is not None,
+        "convergence_s": round(converged, 3) if converged is not None else None,
+        "join_bytes": join_bytes,
+        "idle_rounds": idle_rounds,
+        "idle_bytes_per_round": int(idle_bytes / idle_rounds),
+        "idle_bytes_per_node_round": int(idle_bytes / idle_rounds / len(nodes)),
+    }
+
+
+def git_version():
+    try:
+        out = subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=os.path.dirname(NODE_SCRIPT),
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def flatten(data, prefix=""):
+    out = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            out.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[name] = value
+    return out
+
+
+def compare(old, new):
+    a = flatten({k: old[k] for k in ("merge", "posts", "sync", "rss_kb") if k in old})
+    b = flatten({k: new[k] for k in ("merge", "posts", "sync", "rss_kb") if k in new})
+    print(f"\n{'metric':40} {'old':>14} {'new':>14} {'change':>9}")
+    for key in sorted(set(a) & set(b)):
+        change = f"{(b[key] - a[key]) / a[key] * 100:+.1f}%" if a[key] else ""
+        print(f"{key:40} {a[key]:>14} {b[key]:>14} {change:>9}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="VN Forum node benchmark")
+    ap.add_argument("--nodes", type=int, default=3)
+    ap.add_argument("--posts", type=int, default=1000)
+    ap.add_argument("--body-bytes", type=int, default=600)
+    ap.add_argument("--image-fraction", type=float, default=0.1)
+    ap.add_argument("--image-bytes", type=int, default=40000)
+    ap.add_argument("--batch", type=int, default=50, help="posts per /merge request")
+    ap.add_argument("--clients", type=int, default=8, help="concurrent HTTP clients")
+    ap.add_argument("--page-size", type=int, default=50)
+    ap.add_argument("--requests", type=int, default=500, help="/posts page reads")
+    ap.add_argument("--sync-interval", type=float, default=1.0)
+    ap.add_argument("--sync-timeout", type=float, default=120.0)
+    ap.add_argument("--settle-rounds", type=int, default=3)
+    ap.add_argument("--idle-rounds", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--label", default="")
+    ap.add_argument("--out", default="")
+    ap.add_argument("--compare", default="", help="earlier result JSON to diff against")
+    ap.add_argument("--keep", action="store_true", help="keep node data directories")
+    args = ap.parse_args()
+
+    random.seed(args.seed)
+    root = tempfile.mkdtemp(prefix="vnforum-bench-")
+    nodes = [Node(root, i, args.sync_interval) for i in range(max(1, args.nodes))]
+    corpus = make_corpus(args.posts, args.body_bytes, args.image_fraction, args.image_bytes, args.seed)
+    result = {
+        "label": args.label,
+        "version": git_version(),
+        "time": int(time.time()),
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "keep")},
+    }
+    try:
+        nodes[0].start([])
+        print(f"merge: {args.posts} posts into node 0 ...", flush=True)
+        result["merge"] = bench_merge(nodes[0], corpus, args.batch, args.clients)
+        print(f"posts: {args.requests} page reads ...", flush=True)
+        result["posts"] = bench_posts(nodes[0], args.page_size, args.requests, args.clients)
+        if len(nodes) > 1:
+            print(f"sync: {len(nodes) - 1} empty nodes joining ...", flush=True)
+            result["sync"] = bench_sync(nodes, args.sync_timeout, args.settle_rounds, args.idle_rounds)
+        result["rss_kb"] = {}
+        for node in nodes:
+            cur, peak = node.rss()
+            result["rss_kb"][f"node{node.index}"] = {"rss": cur, "peak": peak}
+    finally:
+        for node in nodes:
+            node.stop()
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    out = args.out or f"forum-bench-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps({k: result[k] for k in ("merge", "posts", "sync") if k in result}, indent=2))
+    print(f"saved {out}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), result)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,56 @@
 #!/usr/bin/env python3
-import base64
 import json
 import os
 import shutil
 import subprocess
+import threading
 import time
 import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import gi
 
 gi.require_version("Gtk", "4.0")
-from gi.repository import Gdk, GdkPixbuf, GLib, Gtk
+from gi.repository import Gdk, GdkPixbuf, Gio, GLib, GObject, Gtk
+
+from vn_forum_node import (
+    NODE_PORT,
+    REACTION_KEYS,
+    add_reaction,
+    blob_path,
+    current_seq,
+    fetch_blob,
+    fetch_events,
+    get_post,
+    has_blob,
+    merge_post,
+    merge_posts,
+    posts_page,
+    put_blob,
+    reaction_total,
+    search_posts,
+    store_version,
+)
 
-DATA_PATH = os.path.expanduser("~/.local/share/vnde/forum_posts.json")
 PEERS_PATH = os.path.expanduser("~/.local/share/vnde/forum_peers.json")
-IMG_CACHE_DIR = os.path.expanduser("~/.cache/vnde/forum_images")
+THUMB_DIR = os.path.expanduser("~/.cache/vnde/forum_images")
+THUMB_W = 520
+THUMB_H = 220
+THUMB_RETRY_MIN = 30
+THUMB_RETRY_MAX = 600
+THUMB_CACHE_MAX = 100 * 1024 * 1024
+TEXTURE_BUDGET = 64 * 1024 * 1024
+REACTION_DEFS = [
+    ("like", "👍"),
+    ("love", "❤️"),
+    ("haha", "😂"),
+]
+EVENTS_RETRY = 4
+FEED_PAGE = 60
+WRITE_DEBOUNCE = 0.3
+WRITE_MAX_DELAY = 1.5
+WRITE_BATCH_MAX = 200
 
 CSS = """
 window { background: #0f1115; }
@@ -24,34 +60,189 @@ window { background: #0f1115; }
 .card { background: #1b1f27; border: 1px solid #2d3442; border-radius: 14px; padding: 12px; }
 .title { font-size: 18px; font-weight: 800; color: #ffffff; }
 .meta { color: #ffffff; font-weight: 700; }
+gridview > child { padding: 6px; }
 """
 
 
-def ensure_data_file():
-    os.makedirs(os.path.dirname(DATA_PATH), exist_ok=True)
-    if not os.path.exists(DATA_PATH):
-        with open(DATA_PATH, "w", encoding="utf-8") as f:
-            json.dump([], f, ensure_ascii=False, indent=2)
+class TextureCache:
+    # LRU of decoded thumbnails bounded by an estimated RGBA byte budget.
+    def __init__(self, budget):
+        self.budget = budget
+        self.used = 0
+        self.items = OrderedDict()
 
+    def get(self, key):
+        tex = self.items.get(key)
+        if tex is not None:
+            self.items.move_to_end(key)
+        return tex
 
-def load_posts():
-    ensure_data_file()
-    try:
-        with open(DATA_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                return data
-    except Exception:
-        pass
-    return []
+    def put(self, key, tex):
+        if key in self.items:
+            self.used -= self.cost(self.items.pop(key))
+        self.items[key] = tex
+        self.used += self.cost(tex)
+        while self.used > self.budget and len(self.items) > 1:
+            _key, old = self.items.popitem(last=False)
+            self.used -= self.cost(old)
 
+    @staticmethod
+    def cost(tex):
+        return tex.get_width() * tex.get_height() * 4
 
-def save_posts(posts):
-    ensure_data_file()
-    tmp = f"{DATA_PATH}.tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(posts, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, DATA_PATH)
+
+TEXTURES = TextureCache(TEXTURE_BUDGET)
+THUMB_PRUNE_LOCK = threading.Lock()
+
+
+def thumb_path(digest):
+    return os.path.join(THUMB_DIR, f"{digest}-{THUMB_W}x{THUMB_H}.png")
+
+
+def load_thumbnail(digest):
+    # Runs off the main loop: decode the full image once, persist a downscaled copy.
+    path = thumb_path(digest)
+    if os.path.exists(path):
+        try:
+            # mtime doubles as the LRU clock for prune_thumbnails().
+            os.utime(path)
+        except OSError:
+            pass
+        return Gdk.Texture.new_from_filename(path)
+    if not has_blob(digest):
+        fetch_blob("127.0.0.1", NODE_PORT, digest, timeout=15, cascade=True)
+    pix = GdkPixbuf.Pixbuf.new_from_file_at_scale(blob_path(digest), THUMB_W, THUMB_H, True)
+    os.makedirs(THUMB_DIR, exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    pix.savev(tmp, "png", [], [])
+    os.replace(tmp, path)
+    prune_thumbnails()
+    return Gdk.Texture.new_for_pixbuf(pix)
+
+
+def prune_thumbnails(limit=THUMB_CACHE_MAX):
+    # Drop least recently shown thumbnails until the disk cache fits, leaving some headroom.
+    with THUMB_PRUNE_LOCK:
+        try:
+            files = [e for e in os.scandir(THUMB_DIR) if e.name.endswith(".png") and e.is_file()]
+        except OSError:
+            return
+        stats = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in files]
+        total = sum(s[1] for s in stats)
+        if total <= limit:
+            return
+        for _mtime, size, path in sorted(stats):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= limit * 0.9:
+                return
+
+
+class PostItem(GObject.Object):
+    def __init__(self, post):
+        super().__init__()
+        self.post = post
+
+
+class PostCard(Gtk.Box):
+    # One recycled card widget; the GridView rebinds it to whichever post scrolls into view.
+    def __init__(self, app):
+        super().__init__(orientation=Gtk.Orientation.VERTICAL, spacing=8)
+        self.app = app
+        self.post_id = ""
+        self.digest = ""
+        self.add_css_class("card")
+        self.set_size_request(560, -1)
+
+        self.title = Gtk.Label(xalign=0)
+        self.title.add_css_class("title")
+        self.meta = Gtk.Label(xalign=0)
+        self.meta.add_css_class("meta")
+        self.body = Gtk.Label(xalign=0)
+        self.body.add_css_class("meta")
+        self.body.set_wrap(True)
+        self.body.set_selectable(True)
+
+        self.picture = Gtk.Picture()
+        self.picture.set_can_shrink(True)
+        self.picture.set_size_request(THUMB_W, THUMB_H)
+
+        reactions = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
+        self.react_buttons = {}
+        for key, _emo in REACTION_DEFS:
+            btn = Gtk.Button()
+            btn.connect("clicked", self.on_react, key)
+            reactions.append(btn)
+            self.react_buttons[key] = btn
+
+        self.comments = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6)
+        row = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        self.entry = Gtk.Entry(placeholder_text="Viet binh luan...")
+        send = Gtk.Button(label="Gui")
+        send.add_css_class("suggested-action")
+        send.connect("clicked", self.on_comment_send)
+        row.append(self.entry)
+        row.append(send)
+
+        self.append(self.title)
+        self.append(self.meta)
+        self.append(self.body)
+        self.append(self.picture)
+        self.append(reactions)
+        self.append(self.comments)
+        self.append(row)
+
+    def bind(self, post):
+        if post.get("id", "") != self.post_id:
+            self.entry.set_text("")
+        self.post_id = post.get("id", "")
+        self.title.set_label(post.get("title", ""))
+        self.meta.set_label(f"{post.get('author','user')} | {post.get('created','')}")
+        self.body.set_label(post.get("body", ""))
+        for key, emo in REACTION_DEFS:
+            self.react_buttons[key].set_label(f"{emo} {reaction_total(post, key)}")
+
+        child = self.comments.get_first_child()
+        while child is not None:
+            nxt = child.get_next_sibling()
+            self.comments.remove(child)
+            child = nxt
+        comments = post.get("comments", [])
+        for c in comments[-4:] if isinstance(comments, list) else []:
+            lbl = Gtk.Label(label=f"{c.get('author','user')}: {c.get('text','')}", xalign=0)
+            lbl.add_css_class("meta")
+            lbl.set_wrap(True)
+            self.comments.append(lbl)
+
+        self.bind_image(post.get("image_sha256", ""))
+
+    def unbind(self):
+        self.digest = ""
+
+    def bind_image(self, digest):
+        self.digest = digest
+        if not blob_path(digest):
+            self.picture.set_paintable(None)
+            self.picture.set_visible(False)
+            return
+        self.picture.set_visible(True)
+        tex = TEXTURES.get(digest)
+        self.picture.set_paintable(tex)
+        if tex is None:
+            self.app.request_thumbnail(digest)
+
+    def on_thumbnail_ready(self, digest, tex):
+        if digest == self.digest:
+            self.picture.set_paintable(tex)
+
+    def on_react(self, _btn, key):
+        self.app.on_react(self.post_id, key)
+
+    def on_comment_send(self, _btn):
+        self.app.on_comment_send(self.post_id, self.entry)
 
 
 def apply_css():
@@ -65,14 +256,34 @@ def apply_css():
 class VNForum(Gtk.Application):
     def __init__(self):
         super().__init__(application_id="vn.de.forum")
-        self.posts = []
-        self.selected_image_b64 = ""
+        self.store = Gio.ListStore(item_type=PostItem)
+        self.items = {}
+        self.cards = []
+        self.pending_thumbs = set()
+        # digest -> (consecutive failures, monotonic time before which no new load is started)
+        self.failed_thumbs = {}
+        self.feed_gen = 0
+        self.search_query = ""
+        self.selected_image_sha = ""
         self.selected_image_name = ""
-        self.last_posts_mtime = 0.0
+        self.last_store_version = None
+        self.seq = 0
+        # Write-behind: queued edits not yet handed to the writer, and every local edit not yet on disk.
+        self.write_queue = {}
+        self.unsaved = {}
+        self.write_timer = 0
+        self.write_first = 0.0
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vnforum-write")
+
+    def do_shutdown(self):
+        self.flush_writes()
+        self.writer.shutdown(wait=True)
+        Gtk.Application.do_shutdown(self)
 
     def do_activate(self):
         apply_css()
-        self.posts = load_posts()
+        self.seq = current_seq()
+        self.last_store_version = store_version()
 
         win = Gtk.ApplicationWindow(application=self)
         self.win = win
@@ -119,24 +330,30 @@ class VNForum(Gtk.Application):
         form.append(attach_row)
         form.append(post_btn)
 
-        self.flow = Gtk.FlowBox()
-        self.flow.set_selection_mode(Gtk.SelectionMode.NONE)
-        self.flow.set_min_children_per_line(1)
-        self.flow.set_max_children_per_line(2)
-        self.flow.set_column_spacing(12)
-        self.flow.set_row_spacing(12)
+        factory = Gtk.SignalListItemFactory()
+        factory.connect("setup", self.on_card_setup)
+        factory.connect("bind", self.on_card_bind)
+        factory.connect("unbind", self.on_card_unbind)
+        factory.connect("teardown", self.on_card_teardown)
+        self.grid = Gtk.GridView(model=Gtk.NoSelection(model=self.store), factory=factory)
+        self.grid.set_min_columns(1)
+        self.grid.set_max_columns(2)
 
         sc = Gtk.ScrolledWindow()
         sc.set_vexpand(True)
         sc.set_hexpand(True)
-        sc.set_child(self.flow)
+        sc.set_child(self.grid)
+
+        self.search = Gtk.SearchEntry(placeholder_text="Tim bai viet, binh luan... (vd: tin tuc)")
+        self.search.connect("search-changed", self.on_search_changed)
 
         root.append(hero)
         root.append(form)
+        root.append(self.search)
         root.append(sc)
         win.set_child(root)
-        self.render_posts()
-        GLib.timeout_add_seconds(4, self.refresh_state)
+        self.load_feed()
+        threading.Thread(target=self.watch_events, daemon=True).start()
         win.maximize()
         win.present()
 
@@ -144,75 +361,179 @@ class VNForum(Gtk.Application):
         t = self.input_title.get_text().strip()
         buf = self.input_body.get_buffer()
         btxt = buf.get_text(buf.get_start_iter(), buf.get_end_iter(), False).strip()
-        if not t or (not btxt and not self.selected_image_b64):
+        if not t or (not btxt and not self.selected_image_sha):
             return
-        self.posts.insert(
-            0,
-            {
-                "id": str(uuid.uuid4()),
-                "title": t,
-                "body": btxt,
-                "author": os.environ.get("USER", "user"),
-                "created": time.strftime("%d/%m/%Y %H:%M"),
-                "created_ts": int(time.time()),
-                "origin": os.uname().nodename,
-                "image_b64": self.selected_image_b64,
-                "image_name": self.selected_image_name,
-                "reactions": {"like": 0, "love": 0, "haha": 0},
-                "comments": [],
-            },
-        )
-        save_posts(self.posts)
+        post = {
+            "id": str(uuid.uuid4()),
+            "title": t,
+            "body": btxt,
+            "author": os.environ.get("USER", "user"),
+            "created": time.strftime("%d/%m/%Y %H:%M"),
+            "created_ts": int(time.time()),
+            "origin": os.uname().nodename,
+            "image_sha256": self.selected_image_sha,
+            "image_name": self.selected_image_name,
+            "reactions": {key: {} for key in REACTION_KEYS},
+            "comments": [],
+        }
+        # Stored on the writer thread like reactions and comments (BEGIN IMMEDIATE can wait on the
+        # node), but flushed at once rather than debounced.
+        self.queue_write(post)
+        self.flush_writes()
+        self.insert_post(post)
         self.input_title.set_text("")
         buf.set_text("")
-        self.selected_image_b64 = ""
+        self.selected_image_sha = ""
         self.selected_image_name = ""
         self.image_info.set_label("Chua co anh")
-        self.render_posts()
 
-    def render_posts(self):
-        child = self.flow.get_first_child()
-        while child is not None:
-            nxt = child.get_next_sibling()
-            self.flow.remove(child)
-            child = nxt
+    def on_card_setup(self, _factory, list_item):
+        card = PostCard(self)
+        self.cards.append(card)
+        list_item.set_child(card)
+
+    def on_card_bind(self, _factory, list_item):
+        list_item.get_child().bind(list_item.get_item().post)
+
+    def on_card_unbind(self, _factory, list_item):
+        list_item.get_child().unbind()
+
+    def on_card_teardown(self, _factory, list_item):
+        card = list_item.get_child()
+        if card in self.cards:
+            self.cards.remove(card)
+
+    def load_feed(self):
+        # First page right away; older pages are appended from idle callbacks.
+        self.feed_gen += 1
+        posts, cursor = posts_page(None, FEED_PAGE)
+        self.set_posts(posts)
+        if cursor:
+            GLib.idle_add(self.load_more, self.feed_gen, cursor)
+
+    def load_more(self, gen, cursor):
+        if gen != self.feed_gen:
+            return False
+        posts, cursor = posts_page(cursor, FEED_PAGE)
+        items = [PostItem(self.with_unsaved(p)) for p in posts if p.get("id", "") not in self.items]
+        for item in items:
+            self.items[item.post.get("id", "")] = item
+        self.store.splice(self.store.get_n_items(), 0, items)
+        if cursor:
+            GLib.idle_add(self.load_more, gen, cursor)
+        return False
+
+    def set_posts(self, posts):
+        items = [PostItem(self.with_unsaved(p)) for p in posts]
+        self.items = {item.post.get("id", ""): item for item in items}
+        self.store.splice(0, self.store.get_n_items(), items)
+
+    def insert_post(self, post):
+        ts = int(post.get("created_ts", 0) or 0)
+        pos = 0
+        n = self.store.get_n_items()
+        while pos < n and int(self.store.get_item(pos).post.get("created_ts", 0) or 0) > ts:
+            pos += 1
+        item = PostItem(post)
+        self.items[post.get("id", "")] = item
+        self.store.insert(pos, item)
+
+    def with_unsaved(self, post):
+        # Keep showing our own edits until the writer has stored them.
+        local = self.unsaved.get(post.get("id", ""))
+        return merge_post(post, local) if local is not None else post
+
+    def apply_post(self, post):
+        post = self.with_unsaved(post)
+        if post.get("id", "") in self.items:
+            self.update_post(post)
+        else:
+            self.insert_post(post)
+
+    def update_post(self, post):
+        # Swap a single model item so only that card is rebound.
+        old = self.items.get(post.get("id", ""))
+        if old is None:
+            return
+        found, pos = self.store.find(old)
+        if not found:
+            return
+        item = PostItem(post)
+        self.items[post["id"]] = item
+        self.store.splice(pos, 1, [item])
 
-        for p in self.posts:
-            card = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=8)
-            card.add_css_class("card")
-            card.set_size_request(560, -1)
-
-            t = Gtk.Label(label=p.get("title", ""), xalign=0)
-            t.add_css_class("title")
-            m = Gtk.Label(label=f"{p.get('author','user')} | {p.get('created','')}", xalign=0)
-            m.add_css_class("meta")
-            b = Gtk.Label(label=p.get("body", ""), xalign=0)
-            b.add_css_class("meta")
-            b.set_wrap(True)
-            b.set_selectable(True)
-
-            img_widget = self.build_image_widget(p)
-            reactions = self.build_reaction_bar(p)
-            comments = self.build_comments_ui(p)
-
-            card.append(t)
-            card.append(m)
-            card.append(b)
-            if img_widget is not None:
-                card.append(img_widget)
-            card.append(reactions)
-            card.append(comments)
-            self.flow.insert(card, -1)
+    def request_thumbnail(self, digest):
+        if digest in self.pending_thumbs:
+            return
+        if time.monotonic() < self.failed_thumbs.get(digest, (0, 0.0))[1]:
+            return
+        self.pending_thumbs.add(digest)
+
+        def worker():
+            try:
+                tex = load_thumbnail(digest)
+            except Exception:
+                tex = None
+            GLib.idle_add(self.on_thumbnail_ready, digest, tex)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def on_thumbnail_ready(self, digest, tex):
+        self.pending_thumbs.discard(digest)
+        if tex is None:
+            fails = self.failed_thumbs.get(digest, (0, 0.0))[0]
+            delay = min(THUMB_RETRY_MAX, THUMB_RETRY_MIN * 2 ** fails)
+            self.failed_thumbs[digest] = (fails + 1, time.monotonic() + delay)
+        else:
+            self.failed_thumbs.pop(digest, None)
+            TEXTURES.put(digest, tex)
+            for card in self.cards:
+                card.on_thumbnail_ready(digest, tex)
+        return False
+
+    def watch_events(self):
+        # Long-poll the local node; it answers as soon as posts change, with their ids.
+        while True:
+            try:
+                data = fetch_events("127.0.0.1", NODE_PORT, self.seq)
+                self.seq = int(data.get("seq", self.seq))
+                GLib.idle_add(self.on_events, data)
+            except Exception:
+                GLib.idle_add(self.refresh_state)
+                time.sleep(EVENTS_RETRY)
+
+    def on_search_changed(self, entry):
+        self.search_query = entry.get_text().strip()
+        self.reload_view()
+
+    def reload_view(self):
+        if not self.search_query:
+            self.load_feed()
+            return
+        self.feed_gen += 1
+        self.set_posts(search_posts(self.search_query))
+
+    def on_events(self, data):
+        if data.get("reload") or (self.search_query and data.get("ids")):
+            self.reload_view()
+        else:
+            for post_id in data.get("ids", []):
+                post = get_post(post_id)
+                if post is not None:
+                    self.apply_post(post)
+        self.last_store_version = store_version()
+        self.peer_label.set_label(f"Peers online: {int(data.get('peers', 0))}")
+        return False
 
     def refresh_state(self):
+        # Fallback while the local node is unreachable.
         try:
-            mtime = os.path.getmtime(DATA_PATH) if os.path.exists(DATA_PATH) else 0.0
+            version = store_version()
             focused = self.get_active_window().get_focus() if self.get_active_window() else None
             typing_now = isinstance(focused, Gtk.Entry)
-            if mtime != self.last_posts_mtime and not typing_now:
-                self.posts = load_posts()
-                self.render_posts()
-                self.last_posts_mtime = mtime
+            if version != self.last_store_version and not typing_now:
+                self.reload_view()
+                self.last_store_version = version
         except Exception:
             pass
         peers = {}
@@ -223,7 +544,7 @@ class VNForum(Gtk.Application):
         except Exception:
             peers = {}
         self.peer_label.set_label(f"Peers online: {len(peers)}")
-        return True
+        return False
 
     def on_pick_image(self, _btn):
         path = self.pick_image_path()
@@ -237,7 +558,7 @@ class VNForum(Gtk.Application):
         if len(raw) > 2 * 1024 * 1024:
             self.image_info.set_label("Anh qua lon (>2MB)")
             return
-        self.selected_image_b64 = base64.b64encode(raw).decode("ascii")
+        self.selected_image_sha = put_blob(raw)
         self.selected_image_name = os.path.basename(path)
         self.image_info.set_label(f"Da chon: {self.selected_image_name}")
 
@@ -274,98 +595,70 @@ class VNForum(Gtk.Application):
         self.image_info.set_label("Thieu bo chon file (cai zenity hoac kdialog)")
         return ""
 
-    def build_image_widget(self, post):
-        b64 = post.get("image_b64", "")
-        if not b64:
-            return None
+    def queue_write(self, post):
+        # Coalesce bursts per post; flush after a quiet spell but never later than WRITE_MAX_DELAY.
+        post_id = post["id"]
+        self.write_queue[post_id] = post
+        self.unsaved[post_id] = post
+        self.update_post(post)
+        now = time.monotonic()
+        if not self.write_first:
+            self.write_first = now
+        if self.write_timer:
+            GLib.source_remove(self.write_timer)
+            self.write_timer = 0
+        waited = now - self.write_first
+        if len(self.write_queue) >= WRITE_BATCH_MAX or waited >= WRITE_MAX_DELAY:
+            self.flush_writes()
+            return
+        delay = min(WRITE_DEBOUNCE, WRITE_MAX_DELAY - waited)
+        self.write_timer = GLib.timeout_add(int(delay * 1000), self.flush_writes)
+
+    def flush_writes(self):
+        if self.write_timer:
+            GLib.source_remove(self.write_timer)
+        self.write_timer = 0
+        self.write_first = 0.0
+        posts = list(self.write_queue.values())
+        self.write_queue = {}
+        if posts:
+            self.writer.submit(self.write_posts, posts)
+        return False
+
+    def write_posts(self, posts):
         try:
-            os.makedirs(IMG_CACHE_DIR, exist_ok=True)
-            out_path = os.path.join(IMG_CACHE_DIR, f"{post.get('id','img')}.bin")
-            raw = base64.b64decode(b64)
-            with open(out_path, "wb") as fp:
-                fp.write(raw)
-            loader = GdkPixbuf.PixbufLoader.new()
-            loader.write(raw)
-            loader.close()
-            pix = loader.get_pixbuf()
-            pic = Gtk.Picture.new_for_pixbuf(pix)
-            pic.set_can_shrink(True)
-            pic.set_size_request(520, 220)
-            return pic
-        except Exception:
-            return None
-
-    def build_reaction_bar(self, post):
-        row = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
-        reacts = post.get("reactions", {})
-        if not isinstance(reacts, dict):
-            reacts = {"like": 0, "love": 0, "haha": 0}
-        post["reactions"] = reacts
-
-        defs = [
-            ("like", "👍"),
-            ("love", "❤️"),
-            ("haha", "😂"),
-        ]
-        for key, emo in defs:
-            count = int(reacts.get(key, 0))
-            btn = Gtk.Button(label=f"{emo} {count}")
-            btn.connect("clicked", self.on_react, post.get("id", ""), key)
-            row.append(btn)
-        return row
-
-    def on_react(self, _btn, post_id, key):
-        for p in self.posts:
-            if p.get("id") != post_id:
-                continue
-            reacts = p.setdefault("reactions", {"like": 0, "love": 0, "haha": 0})
-            reacts[key] = int(reacts.get(key, 0)) + 1
-            break
-        save_posts(self.posts)
-        self.render_posts()
-
-    def build_comments_ui(self, post):
-        wrap = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6)
-        comments = post.get("comments", [])
-        if not isinstance(comments, list):
-            comments = []
-            post["comments"] = comments
-
-        for c in comments[-4:]:
-            txt = f"{c.get('author','user')}: {c.get('text','')}"
-            lbl = Gtk.Label(label=txt, xalign=0)
-            lbl.add_css_class("meta")
-            lbl.set_wrap(True)
-            wrap.append(lbl)
-
-        row = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
-        entry = Gtk.Entry(placeholder_text="Viet binh luan...")
-        send = Gtk.Button(label="Gui")
-        send.add_css_class("suggested-action")
-        send.connect("clicked", self.on_comment_send, post.get("id", ""), entry)
-        row.append(entry)
-        row.append(send)
-        wrap.append(row)
-        return wrap
+            merge_posts(posts)
+        finally:
+            GLib.idle_add(self.on_posts_written, posts)
+
+    def on_posts_written(self, posts):
+        for post in posts:
+            if self.unsaved.get(post["id"]) is post:
+                del self.unsaved[post["id"]]
+        return False
+
+    def on_react(self, post_id, key):
+        item = self.items.get(post_id)
+        if item is None:
+            return
+        self.queue_write(add_reaction(dict(item.post), key))
 
-    def on_comment_send(self, _btn, post_id, entry):
+    def on_comment_send(self, post_id, entry):
         text = entry.get_text().strip()
-        if not text:
+        item = self.items.get(post_id)
+        if not text or item is None:
             return
-        for p in self.posts:
-            if p.get("id") != post_id:
-                continue
-            comments = p.setdefault("comments", [])
-            comments.append(
-                {
-                    "author": os.environ.get("USER", "user"),
-                    "text": text,
-                    "created_ts": int(time.time()),
-                }
-            )
-            break
-        save_posts(self.posts)
-        self.render_posts()
+        post = dict(item.post)
+        post["comments"] = list(post.get("comments", [])) + [
+            {
+                "id": str(uuid.uuid4()),
+                "author": os.environ.get("USER", "user"),
+                "text": text,
+                "created_ts": int(time.time()),
+            }
+        ]
+        entry.set_text("")
+        self.queue_write(post)
 
 
 if __name__ == "__main__":
@@ -1,37 +1,498 @@
 #!/usr/bin/env python3
+import base64
+import gzip
+import hashlib
+import http.client
+import ipaddress
 import json
 import os
+import random
+import re
 import socket
+import sqlite3
+import sys
 import threading
 import time
 import urllib.error
+import urllib.parse
 import urllib.request
 import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-DATA_DIR = os.path.expanduser("~/.local/share/vnde")
+from vn_text import fold_text
+
+DATA_DIR = os.environ.get("VNFORUM_DATA_DIR") or os.path.expanduser("~/.local/share/vnde")
 POSTS_FILE = os.path.join(DATA_DIR, "forum_posts.json")
+DB_FILE = os.path.join(DATA_DIR, "forum.db")
 PEERS_FILE = os.path.join(DATA_DIR, "forum_peers.json")
+BLOB_DIR = os.path.join(DATA_DIR, "blobs")
 
 NODE_PORT = int(os.environ.get("VNFORUM_PORT", "17890"))
+# Port other nodes should call us on, when a proxy or port forward sits in front of NODE_PORT.
+ADVERTISE_PORT = int(os.environ.get("VNFORUM_ADVERTISE_PORT", "0")) or NODE_PORT
 DISCOVERY_PORT = int(os.environ.get("VNFORUM_DISCOVERY_PORT", "17891"))
+# Comma-separated host:port list of nodes to gossip with even when UDP broadcast can't reach them.
+SEEDS = [x.strip() for x in os.environ.get("VNFORUM_SEEDS", "").split(",") if x.strip()]
 
 DISCOVERY_INTERVAL = 6
-SYNC_INTERVAL = 12
+SYNC_INTERVAL = float(os.environ.get("VNFORUM_SYNC_INTERVAL", "12"))
+SYNC_JITTER = 0.25
+SYNC_WORKERS = 8
+SYNC_BACKOFF_MAX = 300
+BLOB_RETRY_MIN = 60
+BLOB_RETRY_MAX = 1800
+GOSSIP_FANOUT = int(os.environ.get("VNFORUM_FANOUT", "3"))
+ANTI_ENTROPY_EVERY = 10
+DIGEST_BATCH = 100
 PEER_TTL = 90
+PEERS_PERSIST_INTERVAL = 15
+CHANGES_PAGE = 200
+POSTS_PAGE_MAX = 500
+STREAM_BATCH = 100
+SEARCH_LIMIT = 50
+EVENTS_TIMEOUT = 25
+EVENTS_MAX_IDS = 500
+REACTION_KEYS = ("like", "love", "haha")
+BLOB_CHUNK = 64 * 1024
+GZIP_MIN_BYTES = 1024
+HTTP_IDLE_TIMEOUT = 30
+POOL_PER_PEER = 4
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Optional JSON-lines log of slow operations and sync failures ("-" for stderr).
+SLOW_LOG = os.environ.get("VNFORUM_SLOW_LOG", "")
+SLOW_MS = float(os.environ.get("VNFORUM_SLOW_MS", "250"))
+BLOB_RE = re.compile(r"^[0-9a-f]{64}$")
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+ROUTES = {
+    "/status", "/metrics", "/digest", "/posts", "/changes", "/search", "/peers", "/events", "/merge", "/fetch",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    id TEXT PRIMARY KEY,
+    created_ts INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_created ON posts(created_ts DESC, id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS peer_cursors (
+    peer TEXT PRIMARY KEY,
+    store_id TEXT NOT NULL,
+    seq INTEGER NOT NULL DEFAULT 0
+);
+"""
 
-LOCK = threading.Lock()
+PEERS_LOCK = threading.Lock()
+STORE_LOCK = threading.Lock()
 HOSTNAME = socket.gethostname()
 
+CHANGED = threading.Condition()
+
+# Live peer table, owned by the node process: "ip:port" -> {"ip", "port", "host", "node", "last_seen"}.
+PEERS = {}
+_peers_dirty = False
+
+_local = threading.local()
+_store_ready = False
+_has_fts = False
+
+# "ip:port" -> (consecutive failures, monotonic time before which the peer is skipped).
+PEER_BACKOFF = {}
+BACKOFF_LOCK = threading.Lock()
+
+# "ip:port" -> ETag of the last full /posts pull from that peer.
+PEER_ETAGS = {}
+
+# "ip:port" -> sync rounds done with that peer, to schedule periodic anti-entropy.
+PEER_ROUNDS = {}
+
+# Per-bucket digests of the local store, rebuilt when the change seq moves.
+DIGEST_CACHE = {"seq": None}
+DIGEST_LOCK = threading.Lock()
+
+# blob hash -> (ip, port) of the peer whose posts referenced it, tried first on a miss.
+BLOB_HINTS = {}
+
+# blob hash -> (consecutive failed peer sweeps, monotonic time before which it is not retried).
+BLOB_MISSES = {}
+BLOB_MISS_LOCK = threading.Lock()
+
+# Prometheus-style registry: (name, labels) -> counter value or [bucket counts..., sum, count].
+METRIC_HELP = {
+    "vnforum_http_request_duration_seconds": ("histogram", "HTTP request latency by route."),
+    "vnforum_http_responses_total": ("counter", "HTTP responses by route and status code."),
+    "vnforum_merge_duration_seconds": ("histogram", "Time spent in merge_posts, lock wait included."),
+    "vnforum_merge_posts_total": ("counter", "Posts passed to merge_posts, by whether they changed the store."),
+    "vnforum_lock_wait_seconds": ("histogram", "Wait for the SQLite write lock (BEGIN IMMEDIATE)."),
+    "vnforum_peer_posts_received_total": ("counter", "Posts pulled from each peer."),
+    "vnforum_peer_bytes_received_total": ("counter", "Response bytes read from each peer, as sent on the wire."),
+    "vnforum_sync_round_duration_seconds": ("histogram", "Duration of a whole gossip sync round."),
+    "vnforum_fetch_failures_total": ("counter", "Failed peer fetches by kind and reason."),
+}
+COUNTERS = {}
+HISTOGRAMS = {}
+METRICS_LOCK = threading.Lock()
+SLOW_LOG_LOCK = threading.Lock()
+
+
+def inc(name, n=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with METRICS_LOCK:
+        COUNTERS[key] = COUNTERS.get(key, 0) + n
+
+
+def observe(name, seconds, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with METRICS_LOCK:
+        h = HISTOGRAMS.get(key)
+        if h is None:
+            h = HISTOGRAMS[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        for i, le in enumerate(LATENCY_BUCKETS):
+            if seconds <= le:
+                h[i] += 1
+        h[-2] += seconds
+        h[-1] += 1
+
+
+def log_event(op, **fields):
+    if not SLOW_LOG:
+        return
+    line = json.dumps({"ts": round(time.time(), 3), "op": op, **fields}, ensure_ascii=False)
+    with SLOW_LOG_LOCK:
+        if SLOW_LOG == "-":
+            print(line, file=sys.stderr, flush=True)
+            return
+        try:
+            with open(SLOW_LOG, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError:
+            pass
+
+
+def log_slow(op, seconds, **fields):
+    if SLOW_LOG and seconds * 1000 >= SLOW_MS:
+        log_event(op, ms=round(seconds * 1000, 2), **fields)
+
+
+def failure_reason(exc):
+    if isinstance(exc, urllib.error.HTTPError):
+        return f"http_{exc.code}"
+    if isinstance(exc, (TimeoutError, socket.timeout)):
+        return "timeout"
+    if isinstance(exc, ConnectionRefusedError):
+        return "refused"
+    if isinstance(exc, (ConnectionResetError, BrokenPipeError, http.client.HTTPException)):
+        return "reset"
+    if isinstance(exc, ValueError):
+        return "bad_response"
+    if isinstance(exc, urllib.error.URLError):
+        return "unreachable"
+    if isinstance(exc, OSError):
+        return "network"
+    return type(exc).__name__
+
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    quoted = []
+    for k, v in pairs:
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        quoted.append(f'{k}="{v}"')
+    return "{" + ",".join(quoted) + "}"
+
+
+def store_gauges():
+    blobs = blob_bytes = 0
+    try:
+        for entry in os.scandir(BLOB_DIR):
+            if entry.is_file() and BLOB_RE.match(entry.name):
+                blobs += 1
+                blob_bytes += entry.stat().st_size
+    except OSError:
+        pass
+    db_bytes = 0
+    for path in (DB_FILE, DB_FILE + "-wal"):
+        try:
+            db_bytes += os.path.getsize(path)
+        except OSError:
+            pass
+    return [
+        ("vnforum_store_posts", "Posts in the local store.", count_posts()),
+        ("vnforum_store_seq", "Local change sequence number.", current_seq()),
+        ("vnforum_store_db_bytes", "SQLite database plus WAL size.", db_bytes),
+        ("vnforum_store_blobs", "Image blobs on disk.", blobs),
+        ("vnforum_store_blob_bytes", "Total size of image blobs.", blob_bytes),
+        ("vnforum_peers_live", "Peers currently in the live table.", len(live_peers())),
+    ]
+
+
+def render_metrics():
+    with METRICS_LOCK:
+        counters = dict(COUNTERS)
+        histograms = {k: list(v) for k, v in HISTOGRAMS.items()}
+    lines = []
+    for name, (kind, help_text) in METRIC_HELP.items():
+        series = counters if kind == "counter" else histograms
+        keys = sorted(k for k in series if k[0] == name)
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key in keys:
+            labels = key[1]
+            if kind == "counter":
+                lines.append(f"{name}{format_labels(labels)} {series[key]}")
+                continue
+            h = series[key]
+            for i, le in enumerate(LATENCY_BUCKETS):
+                lines.append(f"{name}_bucket{format_labels(labels, [('le', le)])} {h[i]}")
+            lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {h[-1]}")
+            lines.append(f"{name}_sum{format_labels(labels)} {h[-2]:.6f}")
+            lines.append(f"{name}_count{format_labels(labels)} {h[-1]}")
+    for name, help_text, value in store_gauges():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def db():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_FILE, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+    return conn
+
 
 def ensure_store():
-    os.makedirs(DATA_DIR, exist_ok=True)
+    global _store_ready
+    if _store_ready:
+        return
+    with STORE_LOCK:
+        if _store_ready:
+            return
+        os.makedirs(DATA_DIR, exist_ok=True)
+        os.makedirs(BLOB_DIR, exist_ok=True)
+        conn = db()
+        conn.executescript(SCHEMA)
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(posts)")}
+        if "seq" not in cols:
+            conn.execute("ALTER TABLE posts ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+            conn.execute("UPDATE posts SET seq = rowid")
+        conn.execute("CREATE INDEX IF NOT EXISTS posts_seq ON posts(seq)")
+        conn.execute("INSERT OR IGNORE INTO meta(key, value) VALUES ('store_id', ?)", (str(uuid.uuid4()),))
+        init_search_index(conn)
+        _store_ready = True
+    migrate_json_posts()
+    migrate_inline_images()
+
+
+def init_search_index(conn):
+    # Full-text index over diacritic-folded text, keyed by posts.rowid.
+    # Without FTS5 in the local SQLite build, search falls back to a linear scan.
+    global _has_fts
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'posts_fts'").fetchone()
+    try:
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(title, body, comments, tokenize='unicode61')"
+        )
+    except sqlite3.OperationalError:
+        _has_fts = False
+        return
+    _has_fts = True
+    if exists:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for rowid, data in conn.execute("SELECT rowid, data FROM posts").fetchall():
+            index_post(conn, rowid, json.loads(data))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+class write_tx:
+    # BEGIN IMMEDIATE so the GUI and the node never interleave seq allocation.
+    def __enter__(self):
+        self.conn = db()
+        started = time.perf_counter()
+        self.conn.execute("BEGIN IMMEDIATE")
+        observe("vnforum_lock_wait_seconds", time.perf_counter() - started)
+        return self.conn
+
+    def __exit__(self, exc_type, _exc, _tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def migrate_json_posts():
+    # One-shot import of the pre-SQLite forum_posts.json; the file is kept as *.migrated.
     if not os.path.exists(POSTS_FILE):
-        with open(POSTS_FILE, "w", encoding="utf-8") as f:
-            json.dump([], f, ensure_ascii=False, indent=2)
-    if not os.path.exists(PEERS_FILE):
-        with open(PEERS_FILE, "w", encoding="utf-8") as f:
-            json.dump({}, f, ensure_ascii=False, indent=2)
+        return
+    legacy = load_json(POSTS_FILE, [])
+    if isinstance(legacy, list) and legacy:
+        merge_posts(legacy)
+    try:
+        os.replace(POSTS_FILE, f"{POSTS_FILE}.migrated")
+    except FileNotFoundError:
+        pass
+
+
+def migrate_inline_images():
+    # Posts stored before the blob store still carry image_b64; re-merging moves it out.
+    rows = db().execute("SELECT data FROM posts WHERE instr(data, '\"image_b64\"') > 0").fetchall()
+    if rows:
+        merge_posts([json.loads(r[0]) for r in rows])
+
+
+def blob_path(digest):
+    if not isinstance(digest, str) or not BLOB_RE.match(digest):
+        return ""
+    return os.path.join(BLOB_DIR, digest)
+
+
+def has_blob(digest):
+    path = blob_path(digest)
+    return bool(path) and os.path.exists(path)
+
+
+def put_blob(raw):
+    digest = hashlib.sha256(raw).hexdigest()
+    path = blob_path(digest)
+    if not os.path.exists(path):
+        os.makedirs(BLOB_DIR, exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(raw)
+        os.replace(tmp, path)
+    return digest
+
+
+class ConnectionPool:
+    # Keep-alive HTTP/1.1 connections to peers, reused across sync rounds.
+    def __init__(self, per_peer=POOL_PER_PEER):
+        self.per_peer = per_peer
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    def _acquire(self, ip, port, timeout):
+        with self.lock:
+            conns = self.idle.get((ip, port))
+            conn = conns.pop() if conns else None
+        if conn is None:
+            return http.client.HTTPConnection(ip, port, timeout=timeout), False
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _release(self, ip, port, conn):
+        with self.lock:
+            conns = self.idle.setdefault((ip, port), [])
+            if len(conns) < self.per_peer:
+                conns.append(conn)
+                return
+        conn.close()
+
+    def request(self, ip, port, path, headers=None, timeout=2.5, method="GET", body=None):
+        # Returns (status, headers, body) with gzip/deflate already undone.
+        headers = dict(headers or {})
+        headers.setdefault("Accept-Encoding", "gzip, deflate")
+        headers.setdefault("X-VNForum-Node", node_header())
+        if body is not None:
+            headers.setdefault("Content-Type", "application/json; charset=utf-8")
+        for _attempt in range(2):
+            conn, reused = self._acquire(ip, port, timeout)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if reused:
+                    # The peer closed an idle keep-alive socket; retry once on a fresh one.
+                    continue
+                if isinstance(e, OSError):
+                    raise
+                raise OSError(str(e)) from e
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(ip, port, conn)
+            inc("vnforum_peer_bytes_received_total", len(data), peer=f"{ip}:{port}")
+            encoding = resp.getheader("Content-Encoding", "")
+            if encoding == "gzip":
+                data = gzip.decompress(data)
+            elif encoding == "deflate":
+                data = zlib.decompress(data)
+            if resp.status >= 400:
+                raise urllib.error.HTTPError(f"http://{ip}:{port}{path}", resp.status, resp.reason, resp.headers, None)
+            return resp.status, resp.headers, data
+        raise OSError("connection lost")
+
+
+POOL = ConnectionPool()
+
+
+def fetch_blob(ip, port, digest, timeout=5, cascade=False):
+    # Pull a blob from another node and keep it only if the content matches its name.
+    # cascade=True lets that node ask its own peers on a miss (used by the local GUI).
+    headers = {} if cascade else {"X-VNForum-Peer": "1"}
+    _status, _headers, raw = POOL.request(ip, port, f"/blob/{digest}", headers, timeout)
+    if hashlib.sha256(raw).hexdigest() != digest:
+        raise ValueError("blob hash mismatch")
+    put_blob(raw)
+    return blob_path(digest)
+
+
+def is_loopback(ip):
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    mapped = getattr(addr, "ipv4_mapped", None)
+    return (mapped or addr).is_loopback
+
+
+def ensure_blob(digest):
+    if has_blob(digest):
+        return blob_path(digest)
+    if not blob_path(digest):
+        return ""
+    with BLOB_MISS_LOCK:
+        fails, retry_at = BLOB_MISSES.get(digest, (0, 0.0))
+    if time.monotonic() < retry_at:
+        # A recent sweep found it nowhere; don't make every rebind in the GUI pay for another one.
+        return ""
+    candidates = []
+    hint = BLOB_HINTS.get(digest)
+    if hint:
+        candidates.append(hint)
+    for info in live_peers().values():
+        peer = (info["ip"], int(info["port"]))
+        if peer not in candidates:
+            candidates.append(peer)
+    for ip, port in candidates:
+        try:
+            path = fetch_blob(ip, port, digest)
+            BLOB_HINTS.pop(digest, None)
+            with BLOB_MISS_LOCK:
+                BLOB_MISSES.pop(digest, None)
+            return path
+        except (urllib.error.URLError, TimeoutError, ValueError, OSError) as e:
+            inc("vnforum_fetch_failures_total", kind="blob", reason=failure_reason(e))
+            continue
+    delay = min(BLOB_RETRY_MAX, BLOB_RETRY_MIN * 2 ** fails)
+    with BLOB_MISS_LOCK:
+        BLOB_MISSES[digest] = (fails + 1, time.monotonic() + delay)
+    return ""
 
 
 def load_json(path, fallback):
@@ -58,72 +519,697 @@ def normalize_post(post):
     p.setdefault("created", time.strftime("%d/%m/%Y %H:%M"))
     p.setdefault("created_ts", int(time.time()))
     p.setdefault("id", str(uuid.uuid4()))
+    inline = p.pop("image_b64", "")
+    if inline and not p.get("image_sha256"):
+        try:
+            p["image_sha256"] = put_blob(base64.b64decode(inline))
+        except (ValueError, OSError):
+            pass
+    p["reactions"] = normalize_reactions(p.get("reactions"))
+    p["comments"] = normalize_comments(p.get("comments"))
     return p
 
 
+def normalize_reactions(reacts):
+    # Reactions are per-node G-counters: {"like": {"<node>": n}}. Legacy plain ints
+    # are kept under the "legacy" slot so they still merge by max.
+    out = {}
+    if not isinstance(reacts, dict):
+        reacts = {}
+    for key in set(REACTION_KEYS) | set(reacts):
+        val = reacts.get(key, {})
+        if isinstance(val, dict):
+            counter = {}
+            for node, n in val.items():
+                try:
+                    counter[str(node)] = max(0, int(n))
+                except (TypeError, ValueError):
+                    continue
+        else:
+            try:
+                counter = {"legacy": max(0, int(val))}
+            except (TypeError, ValueError):
+                counter = {}
+        out[str(key)] = {k: v for k, v in counter.items() if v}
+    return out
+
+
+def comment_id(c):
+    raw = f"{c.get('author', '')}|{c.get('text', '')}|{c.get('created_ts', 0)}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def normalize_comments(comments):
+    # Comments form a grow-only set keyed by comment id.
+    by_id = {}
+    for c in comments if isinstance(comments, list) else []:
+        if not isinstance(c, dict):
+            continue
+        c = dict(c)
+        c["id"] = str(c.get("id") or comment_id(c))
+        by_id[c["id"]] = c
+    return sorted(by_id.values(), key=lambda c: (int(c.get("created_ts", 0) or 0), c["id"]))
+
+
+def reaction_total(post, key):
+    counter = post.get("reactions", {}).get(key, {})
+    if isinstance(counter, dict):
+        return sum(int(v) for v in counter.values())
+    return int(counter or 0)
+
+
+def add_reaction(post, key, node=None):
+    # Each store owns one slot per counter. Hostnames can't be the slot key: cloned images and
+    # default installs share them, and two writers on one slot lose increments under max().
+    node = node or store_id()
+    reacts = normalize_reactions(post.get("reactions"))
+    counter = reacts.setdefault(key, {})
+    counter[node] = counter.get(node, 0) + 1
+    post["reactions"] = reacts
+    return post
+
+
+def merge_post(a, b):
+    # Commutative, idempotent join of two copies of the same post. Posts are never edited, so the
+    # scalar fields only differ after corruption or a version skew; the copy with the larger JSON
+    # encoding wins, which is deterministic on every node but otherwise arbitrary.
+    scalars_a = {k: v for k, v in a.items() if k not in ("reactions", "comments")}
+    scalars_b = {k: v for k, v in b.items() if k not in ("reactions", "comments")}
+    merged = dict(max(scalars_a, scalars_b, key=encode_post))
+    reactions = {}
+    for key in set(a["reactions"]) | set(b["reactions"]):
+        ca = a["reactions"].get(key, {})
+        cb = b["reactions"].get(key, {})
+        reactions[key] = {n: max(ca.get(n, 0), cb.get(n, 0)) for n in set(ca) | set(cb)}
+    merged["reactions"] = reactions
+    merged["comments"] = normalize_comments(a["comments"] + b["comments"])
+    return merged
+
+
+def encode_post(post):
+    return json.dumps(post, ensure_ascii=False, sort_keys=True)
+
+
+def index_post(conn, rowid, post):
+    if not _has_fts:
+        return
+    comments = " ".join(str(c.get("text", "")) for c in post.get("comments", []) if isinstance(c, dict))
+    conn.execute(
+        "INSERT OR REPLACE INTO posts_fts(rowid, title, body, comments) VALUES (?, ?, ?, ?)",
+        (rowid, fold_text(post.get("title")), fold_text(post.get("body")), fold_text(comments)),
+    )
+
+
+def search_posts(query, limit=SEARCH_LIMIT):
+    ensure_store()
+    terms = re.findall(r"\w+", fold_text(query))
+    if not terms:
+        return []
+    if not _has_fts:
+        hits = []
+        for post in load_posts():
+            comments = " ".join(str(c.get("text", "")) for c in post.get("comments", []))
+            hay = fold_text(f"{post.get('title', '')} {post.get('body', '')} {comments}")
+            if all(t in hay for t in terms):
+                hits.append(post)
+                if len(hits) >= limit:
+                    break
+        return hits
+    # Every term must match, as a prefix; bm25 weighs title over body over comments.
+    match = " ".join(f'"{t}"*' for t in terms)
+    rows = db().execute(
+        "SELECT p.data FROM posts_fts f JOIN posts p ON p.rowid = f.rowid "
+        "WHERE posts_fts MATCH ? ORDER BY bm25(posts_fts, 10.0, 3.0, 1.0), p.created_ts DESC LIMIT ?",
+        (match, int(limit)),
+    ).fetchall()
+    return [json.loads(r[0]) for r in rows]
+
+
 def merge_posts(incoming):
     ensure_store()
-    with LOCK:
-        local = load_json(POSTS_FILE, [])
-        by_id = {}
-        for p in local:
-            np = normalize_post(p)
-            by_id[np["id"]] = np
+    started = time.perf_counter()
+    with write_tx() as conn:
+        seq = start_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM posts").fetchone()[0]
         for p in incoming:
+            if not isinstance(p, dict):
+                continue
             np = normalize_post(p)
-            by_id[np["id"]] = np
-        merged = sorted(by_id.values(), key=lambda x: x.get("created_ts", 0), reverse=True)
-        save_json(POSTS_FILE, merged)
-        return len(merged)
+            pid = str(np["id"])
+            row = conn.execute("SELECT data FROM posts WHERE id = ?", (pid,)).fetchone()
+            if row is not None:
+                np = merge_post(normalize_post(json.loads(row[0])), np)
+            data = encode_post(np)
+            if row is not None and row[0] == data:
+                continue
+            seq += 1
+            conn.execute(
+                "INSERT INTO posts(id, created_ts, data, seq) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET created_ts = excluded.created_ts, "
+                "data = excluded.data, seq = excluded.seq",
+                (pid, int(np.get("created_ts", 0)), data, seq),
+            )
+            rowid = conn.execute("SELECT rowid FROM posts WHERE id = ?", (pid,)).fetchone()[0]
+            index_post(conn, rowid, np)
+    elapsed = time.perf_counter() - started
+    observe("vnforum_merge_duration_seconds", elapsed)
+    inc("vnforum_merge_posts_total", seq - start_seq, result="changed")
+    inc("vnforum_merge_posts_total", len(incoming) - (seq - start_seq), result="unchanged")
+    log_slow("merge", elapsed, posts=len(incoming), changed=seq - start_seq)
+    if seq != start_seq:
+        with CHANGED:
+            CHANGED.notify_all()
+    return count_posts()
 
 
-def update_peer(ip, port, host):
+def count_posts():
     ensure_store()
-    with LOCK:
-        peers = load_json(PEERS_FILE, {})
-        peers[ip] = {"port": int(port), "host": host, "last_seen": int(time.time())}
-        save_json(PEERS_FILE, peers)
+    return db().execute("SELECT COUNT(*) FROM posts").fetchone()[0]
 
 
-def live_peers():
+def load_posts():
     ensure_store()
+    rows = db().execute("SELECT data FROM posts ORDER BY created_ts DESC, id").fetchall()
+    return [json.loads(r[0]) for r in rows]
+
+
+def encode_cursor(created_ts, post_id):
+    raw = json.dumps([int(created_ts), str(post_id)]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_ts, post_id = json.loads(raw.decode("utf-8"))
+        return int(created_ts), str(post_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError("bad cursor")
+
+
+def iter_posts(cursor=None, limit=None):
+    # Yields (created_ts, id, data) newest first, resuming strictly after `cursor`,
+    # straight off the (created_ts DESC, id) index. A cursor is resumed with two queries (rest of
+    # its timestamp, then everything older): an OR of both makes SQLite sort in a temp B-tree.
+    ensure_store()
+    order = " ORDER BY created_ts DESC, id"
+    if cursor:
+        created_ts, post_id = decode_cursor(cursor)
+        queries = [
+            (" WHERE created_ts = ? AND id > ?" + order, [created_ts, post_id]),
+            (" WHERE created_ts < ?" + order, [created_ts]),
+        ]
+    else:
+        queries = [(order, [])]
+    remaining = limit
+    for where, args in queries:
+        sql = "SELECT created_ts, id, data FROM posts" + where
+        if remaining is not None:
+            sql += " LIMIT ?"
+            args = args + [int(remaining)]
+        cur = db().execute(sql, args)
+        while True:
+            rows = cur.fetchmany(STREAM_BATCH)
+            if not rows:
+                break
+            if remaining is not None:
+                remaining -= len(rows)
+            yield from rows
+        if remaining is not None and remaining <= 0:
+            return
+
+
+def posts_page(cursor=None, limit=CHANGES_PAGE):
+    rows = list(iter_posts(cursor, limit + 1))
+    next_cursor = encode_cursor(rows[limit - 1][0], rows[limit - 1][1]) if len(rows) > limit else None
+    return [json.loads(r[2]) for r in rows[:limit]], next_cursor
+
+
+def get_post(post_id):
+    ensure_store()
+    row = db().execute("SELECT data FROM posts WHERE id = ?", (post_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def store_id():
+    ensure_store()
+    return db().execute("SELECT value FROM meta WHERE key = 'store_id'").fetchone()[0]
+
+
+def current_seq():
+    ensure_store()
+    return db().execute("SELECT COALESCE(MAX(seq), 0) FROM posts").fetchone()[0]
+
+
+def changes_since(since, limit=CHANGES_PAGE):
+    ensure_store()
+    rows = db().execute(
+        "SELECT seq, data FROM posts WHERE seq > ? ORDER BY seq LIMIT ?", (int(since), int(limit) + 1)
+    ).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    seq = rows[-1][0] if rows else max(int(since), 0)
+    return {
+        "store_id": store_id(),
+        "seq": seq,
+        "more": more,
+        "posts": [json.loads(r[1]) for r in rows],
+    }
+
+
+def peer_cursor(peer):
+    ensure_store()
+    row = db().execute("SELECT store_id, seq FROM peer_cursors WHERE peer = ?", (peer,)).fetchone()
+    if row is None:
+        return "", 0
+    return row[0], int(row[1])
+
+
+def save_peer_cursor(peer, peer_store_id, seq):
+    ensure_store()
+    db().execute(
+        "INSERT INTO peer_cursors(peer, store_id, seq) VALUES (?, ?, ?) "
+        "ON CONFLICT(peer) DO UPDATE SET store_id = excluded.store_id, seq = excluded.seq",
+        (peer, peer_store_id, int(seq)),
+    )
+
+
+def wait_changes(since, timeout=EVENTS_TIMEOUT):
+    # Long-poll: block until a post changes after `since` or the timeout runs out.
+    deadline = time.time() + timeout
+    with CHANGED:
+        while current_seq() <= since:
+            left = deadline - time.time()
+            if left <= 0:
+                break
+            CHANGED.wait(left)
+    rows = db().execute(
+        "SELECT id, seq FROM posts WHERE seq > ? ORDER BY seq LIMIT ?", (int(since), EVENTS_MAX_IDS + 1)
+    ).fetchall()
+    peers = len(live_peers())
+    if len(rows) > EVENTS_MAX_IDS:
+        return {"seq": current_seq(), "ids": [], "reload": True, "peers": peers}
+    return {
+        "seq": rows[-1][1] if rows else int(since),
+        "ids": [r[0] for r in rows],
+        "reload": False,
+        "peers": peers,
+    }
+
+
+def store_version():
+    # Changes whenever another connection (node or GUI) commits to the store.
+    ensure_store()
+    return db().execute("PRAGMA data_version").fetchone()[0]
+
+
+def node_header():
+    return f"{ADVERTISE_PORT};{store_id()};{HOSTNAME}"
+
+
+def update_peer(ip, port, host, node="", last_seen=None):
+    # last_seen comes from gossip when we only heard about the peer second-hand.
+    global _peers_dirty
+    if node and node == store_id():
+        return
     now = int(time.time())
-    with LOCK:
-        peers = load_json(PEERS_FILE, {})
-        peers = {k: v for k, v in peers.items() if now - int(v.get("last_seen", 0)) <= PEER_TTL}
-        save_json(PEERS_FILE, peers)
-        return peers
+    seen = now if last_seen is None else min(int(last_seen), now)
+    addr = f"{ip}:{int(port)}"
+    with PEERS_LOCK:
+        old = PEERS.get(addr)
+        if old is not None and int(old.get("last_seen", 0)) >= seen:
+            return
+        PEERS[addr] = {
+            "ip": ip,
+            "port": int(port),
+            "host": str(host),
+            "node": str(node or (old or {}).get("node", "")),
+            "last_seen": seen,
+        }
+        _peers_dirty = True
+
+
+def live_peers():
+    global _peers_dirty
+    now = int(time.time())
+    with PEERS_LOCK:
+        for addr in [k for k, v in PEERS.items() if now - int(v.get("last_seen", 0)) > PEER_TTL]:
+            del PEERS[addr]
+            _peers_dirty = True
+        return {k: dict(v) for k, v in PEERS.items()}
+
+
+def peer_entries(data, via_ip=""):
+    # Accepts both the "ip:port" table and the older ip-keyed one.
+    if not isinstance(data, dict):
+        return
+    for key, info in data.items():
+        if not isinstance(info, dict):
+            continue
+        ip = str(info.get("ip") or key.rsplit(":", 1)[0])
+        if via_ip and ip.startswith("127.") and not via_ip.startswith("127."):
+            # Loopback as seen by a remote peer is that peer's own host, not ours.
+            continue
+        try:
+            port = int(info.get("port", NODE_PORT))
+            last_seen = int(info.get("last_seen", 0))
+        except (TypeError, ValueError):
+            continue
+        yield ip, port, str(info.get("host", "peer")), str(info.get("node", "")), last_seen
+
+
+def load_peers():
+    # Warm start: peers seen shortly before a restart are still worth syncing with.
+    for ip, port, host, node, last_seen in peer_entries(load_json(PEERS_FILE, {})):
+        update_peer(ip, port, host, node, last_seen)
+    live_peers()
+
+
+def persist_peers_loop():
+    # forum_peers.json is only a snapshot for the GUI fallback, written at most every few seconds.
+    global _peers_dirty
+    while True:
+        time.sleep(PEERS_PERSIST_INTERVAL)
+        peers = live_peers()
+        with PEERS_LOCK:
+            dirty, _peers_dirty = _peers_dirty, False
+        if dirty:
+            try:
+                save_json(PEERS_FILE, peers)
+            except OSError:
+                with PEERS_LOCK:
+                    _peers_dirty = True
+
+
+def digest_bucket(post_id):
+    return hashlib.sha1(post_id.encode("utf-8")).hexdigest()[:2]
+
+
+def local_digest():
+    # Two-level hash tree: root over 256 buckets, each over "id:content-hash" of its posts.
+    seq = current_seq()
+    with DIGEST_LOCK:
+        if DIGEST_CACHE.get("seq") == seq:
+            return DIGEST_CACHE
+        items = {}
+        for post_id, data in db().execute("SELECT id, data FROM posts"):
+            h = hashlib.sha1(data.encode("utf-8")).hexdigest()[:16]
+            items.setdefault(digest_bucket(post_id), {})[post_id] = h
+        buckets = {}
+        for b, entries in items.items():
+            joined = "|".join(f"{k}:{v}" for k, v in sorted(entries.items()))
+            buckets[b] = hashlib.sha1(joined.encode("utf-8")).hexdigest()[:16]
+        root = hashlib.sha1("|".join(f"{k}:{v}" for k, v in sorted(buckets.items())).encode("utf-8")).hexdigest()
+        DIGEST_CACHE.clear()
+        DIGEST_CACHE.update({"seq": seq, "root": root, "buckets": buckets, "items": items})
+        return DIGEST_CACHE
+
+
+def posts_etag():
+    return f'"{store_id()}-{current_seq()}"'
+
+
+def peers_etag(peers):
+    # Weak: last_seen ticks on every hello, but the peer set itself is what clients care about.
+    members = sorted(f"{addr}:{info.get('host', '')}" for addr, info in peers.items())
+    return 'W/"' + hashlib.sha1("|".join(members).encode("utf-8")).hexdigest() + '"'
 
 
 class Handler(BaseHTTPRequestHandler):
-    def _send(self, code, data):
-        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    protocol_version = "HTTP/1.1"
+    timeout = HTTP_IDLE_TIMEOUT
+
+    def _not_modified(self, etag):
+        # If-None-Match uses weak comparison, so W/ prefixes are ignored on both sides.
+        opaque = etag.replace("W/", "", 1)
+        tags = {t.strip().replace("W/", "", 1) for t in self.headers.get("If-None-Match", "").split(",")}
+        if opaque not in tags and "*" not in tags:
+            return False
+        self.send_response(304)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        return True
+
+    def _send(self, code, data, etag=None):
+        self._send_bytes(code, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8", etag)
+
+    def _send_bytes(self, code, body, content_type, etag=None):
+        encoding = ""
+        if len(body) >= GZIP_MIN_BYTES:
+            accepted = self.headers.get("Accept-Encoding", "")
+            if "gzip" in accepted:
+                encoding, body = "gzip", gzip.compress(body, compresslevel=5)
+            elif "deflate" in accepted:
+                encoding, body = "deflate", zlib.compress(body, 5)
         self.send_response(code)
-        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Type", content_type)
         self.send_header("Content-Length", str(len(body)))
+        self.send_header("Vary", "Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        if etag:
+            self.send_header("ETag", etag)
         self.end_headers()
         self.wfile.write(body)
 
+    def _write_chunk(self, data):
+        if data:
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+
+    def _stream_posts(self, cursor, limit, etag):
+        # NDJSON, one post per line, written as rows come off the index (chunked encoding).
+        rows = iter_posts(cursor, limit)
+        first = next(rows, None)
+        accepted = self.headers.get("Accept-Encoding", "")
+        packer = zlib.compressobj(5, zlib.DEFLATED, 31) if "gzip" in accepted else None
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("ETag", etag)
+        if packer is not None:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        buf = []
+        row = first
+        while row is not None:
+            buf.append(row[2].encode("utf-8") + b"\n")
+            row = next(rows, None)
+            if len(buf) >= STREAM_BATCH or row is None:
+                data = b"".join(buf)
+                buf = []
+                self._write_chunk(packer.compress(data) if packer else data)
+        if packer is not None:
+            self._write_chunk(packer.flush())
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send_blob(self, digest):
+        path = blob_path(digest)
+        if not path:
+            self._send(400, {"ok": False, "error": "bad_hash"})
+            return
+        # Only the local GUI triggers a lazy pull: remote callers (peers or not) never make
+        # this node fan out to its own peers.
+        local_gui = is_loopback(self.client_address[0]) and not self.headers.get("X-VNForum-Peer")
+        if not os.path.exists(path) and local_gui:
+            path = ensure_blob(digest)
+        if not path or not os.path.exists(path):
+            self._send(404, {"ok": False, "error": "blob_not_found"})
+            return
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        code = 200
+        rng = self.headers.get("Range", "")
+        if rng:
+            m = RANGE_RE.match(rng.strip())
+            if m is None or (not m.group(1) and not m.group(2)):
+                self._send_range_error(size)
+                return
+            if m.group(1):
+                start = int(m.group(1))
+                end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+            else:
+                start = max(0, size - int(m.group(2)))
+            if start > end or start >= size:
+                self._send_range_error(size)
+                return
+            code = 206
+        self.send_response(code)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", f'"{digest}"')
+        self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        if code == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        with open(path, "rb") as f:
+            f.seek(start)
+            left = end - start + 1
+            while left > 0:
+                chunk = f.read(min(BLOB_CHUNK, left))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                left -= len(chunk)
+
+    def _send_range_error(self, size):
+        self.send_response(416)
+        self.send_header("Content-Range", f"bytes */{size}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _get_posts(self, url, query):
+        paged = "limit" in query or "cursor" in query
+        ndjson = query.get("format", [""])[0] == "ndjson" or "application/x-ndjson" in self.headers.get("Accept", "")
+        etag = posts_etag()
+        if paged or ndjson:
+            etag = etag[:-1] + "-" + hashlib.sha1(url.query.encode("utf-8")).hexdigest()[:12] + '"'
+        if self._not_modified(etag):
+            return
+        if not paged and not ndjson:
+            self._send(200, load_posts(), etag)
+            return
+        try:
+            limit = min(int(query.get("limit", [str(POSTS_PAGE_MAX)])[0]), POSTS_PAGE_MAX) if paged else None
+        except ValueError:
+            limit = 0
+        try:
+            cursor = query.get("cursor", [""])[0] or None
+            if cursor:
+                decode_cursor(cursor)
+        except ValueError:
+            self._send(400, {"ok": False, "error": "bad_cursor"})
+            return
+        if limit is not None and limit < 1:
+            self._send(400, {"ok": False, "error": "bad_limit"})
+            return
+        if ndjson:
+            self._stream_posts(cursor, limit, etag)
+            return
+        posts, next_cursor = posts_page(cursor, limit)
+        self._send(200, {"posts": posts, "next_cursor": next_cursor}, etag)
+
+    def _register_caller(self):
+        # Nodes announce themselves on every request, so being contacted is enough to be known.
+        parts = self.headers.get("X-VNForum-Node", "").split(";", 2)
+        if len(parts) != 3:
+            return
+        try:
+            update_peer(self.client_address[0], int(parts[0]), parts[2], parts[1])
+        except ValueError:
+            pass
+
+    def send_response(self, code, message=None):
+        self._status = code
+        super().send_response(code, message)
+
+    def _timed(self, method, handler):
+        self._status = 0
+        started = time.perf_counter()
+        try:
+            handler()
+        finally:
+            elapsed = time.perf_counter() - started
+            path = urllib.parse.urlsplit(self.path).path
+            route = "/blob" if path.startswith("/blob/") else path if path in ROUTES else "other"
+            observe("vnforum_http_request_duration_seconds", elapsed, route=route, method=method)
+            inc("vnforum_http_responses_total", route=route, code=str(self._status))
+            if route != "/events":
+                # /events is a long-poll; its latency is the timeout, not work done.
+                log_slow("http", elapsed, method=method, path=self.path[:200], code=self._status)
+
     def do_GET(self):
-        if self.path == "/status":
-            self._send(200, {"ok": True, "host": HOSTNAME, "port": NODE_PORT})
+        self._timed("GET", self._do_get)
+
+    def do_POST(self):
+        self._timed("POST", self._do_post)
+
+    def _do_get(self):
+        self._register_caller()
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        if url.path == "/metrics":
+            body = render_metrics().encode("utf-8")
+            self._send_bytes(200, body, "text/plain; version=0.0.4; charset=utf-8")
             return
-        if self.path == "/posts":
-            ensure_store()
-            self._send(200, load_json(POSTS_FILE, []))
+        if url.path == "/status":
+            self._send(200, {"ok": True, "host": HOSTNAME, "port": NODE_PORT, "node": store_id()})
             return
-        if self.path == "/peers":
-            self._send(200, live_peers())
+        if url.path == "/digest":
+            digest = local_digest()
+            bucket = query.get("bucket", [""])[0]
+            if bucket:
+                self._send(200, {"bucket": bucket, "items": digest["items"].get(bucket, {})})
+            else:
+                self._send(
+                    200,
+                    {"store_id": store_id(), "seq": digest["seq"], "root": digest["root"], "buckets": digest["buckets"]},
+                )
+            return
+        if url.path == "/posts":
+            self._get_posts(url, query)
+            return
+        if url.path == "/changes":
+            try:
+                since = int(query.get("since", ["0"])[0])
+                limit = max(1, min(int(query.get("limit", [str(CHANGES_PAGE)])[0]), CHANGES_PAGE))
+            except ValueError:
+                self._send(400, {"ok": False, "error": "bad_since"})
+                return
+            self._send(200, changes_since(since, limit))
+            return
+        if url.path == "/search":
+            q = query.get("q", [""])[0]
+            try:
+                limit = max(1, min(int(query.get("limit", [str(SEARCH_LIMIT)])[0]), POSTS_PAGE_MAX))
+            except ValueError:
+                limit = SEARCH_LIMIT
+            started = time.perf_counter()
+            posts = search_posts(q, limit)
+            took_ms = round((time.perf_counter() - started) * 1000, 2)
+            self._send(200, {"q": q, "took_ms": took_ms, "posts": posts})
+            return
+        if url.path == "/peers":
+            peers = live_peers()
+            etag = peers_etag(peers)
+            if not self._not_modified(etag):
+                self._send(200, peers, etag)
+            return
+        if url.path == "/events":
+            try:
+                since = int(query.get("since", ["0"])[0])
+                timeout = max(0.0, min(float(query.get("timeout", [str(EVENTS_TIMEOUT)])[0]), 60.0))
+            except ValueError:
+                self._send(400, {"ok": False, "error": "bad_since"})
+                return
+            self._send(200, wait_changes(since, timeout))
+            return
+        if url.path.startswith("/blob/"):
+            self._send_blob(url.path[len("/blob/"):])
             return
         self._send(404, {"ok": False, "error": "not_found"})
 
-    def do_POST(self):
+    def _do_post(self):
+        # Always drain the body so the keep-alive connection stays in sync.
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+        except ValueError:
+            length = 0
+        raw = self.rfile.read(length) if length > 0 else b""
+        self._register_caller()
+        if self.path == "/fetch":
+            try:
+                ids = json.loads(raw.decode("utf-8")).get("ids", [])
+                posts = [p for p in (get_post(str(i)) for i in ids[:POSTS_PAGE_MAX]) if p is not None]
+                self._send(200, posts)
+            except Exception as e:
+                self._send(400, {"ok": False, "error": str(e)})
+            return
         if self.path != "/merge":
             self._send(404, {"ok": False, "error": "not_found"})
             return
         try:
-            length = int(self.headers.get("Content-Length", "0"))
-            raw = self.rfile.read(length)
             data = json.loads(raw.decode("utf-8"))
             if not isinstance(data, list):
                 raise ValueError("payload must be list")
@@ -137,7 +1223,9 @@ class Handler(BaseHTTPRequestHandler):
 
 
 def discovery_broadcast():
-    payload = json.dumps({"type": "vnforum_hello", "port": NODE_PORT, "host": HOSTNAME}).encode("utf-8")
+    payload = json.dumps(
+        {"type": "vnforum_hello", "port": ADVERTISE_PORT, "host": HOSTNAME, "node": store_id()}
+    ).encode("utf-8")
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
     while True:
@@ -159,34 +1247,214 @@ def discovery_listener():
             if msg.get("type") != "vnforum_hello":
                 continue
             ip = addr[0]
-            if ip.startswith("127."):
-                continue
             port = int(msg.get("port", NODE_PORT))
-            host = str(msg.get("host", "peer"))
-            update_peer(ip, port, host)
+            if ip.startswith("127.") and port == ADVERTISE_PORT:
+                continue
+            update_peer(ip, port, str(msg.get("host", "peer")), str(msg.get("node", "")))
         except Exception:
             pass
 
 
 def fetch_posts(ip, port):
-    url = f"http://{ip}:{port}/posts"
-    req = urllib.request.Request(url, method="GET")
-    with urllib.request.urlopen(req, timeout=2.5) as r:
+    # Returns None when the peer's posts are unchanged since our last pull (304).
+    peer = f"{ip}:{port}"
+    headers = {}
+    if PEER_ETAGS.get(peer):
+        headers["If-None-Match"] = PEER_ETAGS[peer]
+    status, resp_headers, body = POOL.request(ip, port, "/posts", headers)
+    if status == 304:
+        return None
+    if resp_headers.get("ETag"):
+        PEER_ETAGS[peer] = resp_headers.get("ETag")
+    return json.loads(body.decode("utf-8"))
+
+
+def fetch_changes(ip, port, since):
+    _status, _headers, body = POOL.request(ip, port, f"/changes?since={int(since)}")
+    return json.loads(body.decode("utf-8"))
+
+
+def fetch_events(ip, port, since, timeout=EVENTS_TIMEOUT):
+    url = f"http://{ip}:{port}/events?since={int(since)}&timeout={timeout}"
+    with urllib.request.urlopen(url, timeout=timeout + 10) as r:
         return json.loads(r.read().decode("utf-8"))
 
 
-def sync_loop():
+def remember_blob_sources(posts, ip, port):
+    for p in posts:
+        digest = p.get("image_sha256") if isinstance(p, dict) else None
+        if digest and blob_path(digest) and not has_blob(digest):
+            BLOB_HINTS[digest] = (ip, int(port))
+            # A peer that references the blob may well have it: retry now rather than after the backoff.
+            with BLOB_MISS_LOCK:
+                BLOB_MISSES.pop(digest, None)
+
+
+def merge_from(posts, ip, port):
+    merge_posts(posts)
+    remember_blob_sources(posts, ip, port)
+    inc("vnforum_peer_posts_received_total", len(posts), peer=f"{ip}:{port}")
+
+
+def sync_peer(ip, port):
+    peer = f"{ip}:{port}"
+    sid, since = peer_cursor(peer)
     while True:
-        peers = live_peers()
-        for ip, info in peers.items():
-            port = int(info.get("port", NODE_PORT))
-            try:
-                posts = fetch_posts(ip, port)
-                if isinstance(posts, list):
-                    merge_posts(posts)
-            except (urllib.error.URLError, TimeoutError, ValueError, OSError):
+        try:
+            page = fetch_changes(ip, port, since)
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                raise
+            # Peer predates /changes: fall back to a full pull.
+            posts = fetch_posts(ip, port)
+            if isinstance(posts, list):
+                merge_from(posts, ip, port)
+            return
+        page_sid = str(page.get("store_id", ""))
+        if page_sid != sid:
+            # Unknown or recreated peer store: its seq numbers mean nothing to us any more.
+            sid = page_sid
+            if since:
+                since = 0
                 continue
-        time.sleep(SYNC_INTERVAL)
+        posts = page.get("posts", [])
+        if isinstance(posts, list) and posts:
+            merge_from(posts, ip, port)
+        since = int(page.get("seq", since))
+        save_peer_cursor(peer, sid, since)
+        if not page.get("more"):
+            return
+
+
+def exchange_peers(ip, port):
+    # Gossip membership: learn the peer's view of the cluster (304 when it hasn't changed).
+    key = f"{ip}:{port}/peers"
+    headers = {"If-None-Match": PEER_ETAGS[key]} if PEER_ETAGS.get(key) else {}
+    status, resp_headers, body = POOL.request(ip, port, "/peers", headers)
+    if status == 304:
+        return
+    if resp_headers.get("ETag"):
+        PEER_ETAGS[key] = resp_headers.get("ETag")
+    for p_ip, p_port, host, node, last_seen in peer_entries(json.loads(body.decode("utf-8")), ip):
+        update_peer(p_ip, p_port, host, node, last_seen)
+
+
+def post_json(ip, port, path, payload):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    _status, _headers, data = POOL.request(ip, port, path, method="POST", body=body, timeout=10)
+    return json.loads(data.decode("utf-8"))
+
+
+def anti_entropy(ip, port):
+    # Compare hash trees and move only the posts that differ, in both directions.
+    _status, _headers, body = POOL.request(ip, port, "/digest")
+    remote = json.loads(body.decode("utf-8"))
+    local = local_digest()
+    if remote.get("root") == local["root"]:
+        return remote
+    r_buckets = remote.get("buckets", {})
+    l_buckets = local["buckets"]
+    want, give, diverged = [], [], []
+    for b in sorted(set(r_buckets) | set(l_buckets)):
+        if r_buckets.get(b) == l_buckets.get(b):
+            continue
+        r_items = {}
+        if b in r_buckets:
+            _status, _headers, body = POOL.request(ip, port, f"/digest?bucket={b}")
+            r_items = json.loads(body.decode("utf-8")).get("items", {})
+        l_items = local["items"].get(b, {})
+        want += [i for i, h in r_items.items() if l_items.get(i) != h]
+        give += [i for i, h in l_items.items() if i not in r_items]
+        diverged += [i for i, h in r_items.items() if i in l_items and l_items[i] != h]
+    for i in range(0, len(want), DIGEST_BATCH):
+        posts = post_json(ip, port, "/fetch", {"ids": want[i : i + DIGEST_BATCH]})
+        if isinstance(posts, list) and posts:
+            merge_from(posts, ip, port)
+    # Push back what they lack plus our merged copy of posts both sides had in different versions.
+    push = give + diverged
+    for i in range(0, len(push), DIGEST_BATCH):
+        posts = [p for p in (get_post(pid) for pid in push[i : i + DIGEST_BATCH]) if p is not None]
+        if posts:
+            post_json(ip, port, "/merge", posts)
+    return remote
+
+
+def sync_with(ip, port):
+    peer = f"{ip}:{port}"
+    exchange_peers(ip, port)
+    sid, _since = peer_cursor(peer)
+    rounds = PEER_ROUNDS.get(peer, 0)
+    PEER_ROUNDS[peer] = rounds + 1
+    if not sid or rounds % ANTI_ENTROPY_EVERY == 0:
+        try:
+            remote = anti_entropy(ip, port)
+            save_peer_cursor(peer, str(remote.get("store_id", "")), int(remote.get("seq", 0)))
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                raise
+    sync_peer(ip, port)
+
+
+def peer_ready(peer):
+    with BACKOFF_LOCK:
+        _fails, retry_at = PEER_BACKOFF.get(peer, (0, 0.0))
+    return time.monotonic() >= retry_at
+
+
+def peer_succeeded(peer):
+    with BACKOFF_LOCK:
+        PEER_BACKOFF.pop(peer, None)
+
+
+def peer_failed(peer):
+    with BACKOFF_LOCK:
+        fails = PEER_BACKOFF.get(peer, (0, 0.0))[0] + 1
+        delay = min(SYNC_BACKOFF_MAX, SYNC_INTERVAL * 2 ** (fails - 1))
+        PEER_BACKOFF[peer] = (fails, time.monotonic() + delay * random.uniform(0.5, 1.0))
+
+
+def sync_candidates():
+    candidates = {addr: (info["ip"], int(info["port"])) for addr, info in live_peers().items()}
+    for seed in SEEDS:
+        host, _sep, port = seed.rpartition(":") if ":" in seed else (seed, "", str(NODE_PORT))
+        try:
+            candidates.setdefault(f"{host}:{int(port)}", (host, int(port)))
+        except ValueError:
+            continue
+    return candidates
+
+
+def sync_round(pool):
+    # Gossip with a small random fan-out in parallel; the round lasts as long as the slowest pick.
+    ready = [(addr, ip_port) for addr, ip_port in sync_candidates().items() if peer_ready(addr)]
+    jobs = {}
+    for peer, (ip, port) in random.sample(ready, min(GOSSIP_FANOUT, len(ready))):
+        jobs[pool.submit(sync_with, ip, port)] = peer
+    for fut in as_completed(jobs):
+        peer = jobs[fut]
+        try:
+            fut.result()
+            peer_succeeded(peer)
+        except (urllib.error.URLError, TimeoutError, ValueError, OSError) as e:
+            reason = failure_reason(e)
+            inc("vnforum_fetch_failures_total", kind="sync", reason=reason)
+            log_event("sync_failed", peer=peer, reason=reason, error=str(e)[:200])
+            peer_failed(peer)
+
+
+def sync_loop():
+    pool = ThreadPoolExecutor(max_workers=SYNC_WORKERS, thread_name_prefix="vnforum-sync")
+    while True:
+        started = time.perf_counter()
+        try:
+            sync_round(pool)
+        except Exception as e:
+            inc("vnforum_fetch_failures_total", kind="round", reason=failure_reason(e))
+            log_event("sync_round_failed", error=repr(e)[:200])
+        elapsed = time.perf_counter() - started
+        observe("vnforum_sync_round_duration_seconds", elapsed)
+        log_slow("sync_round", elapsed)
+        time.sleep(SYNC_INTERVAL * random.uniform(1 - SYNC_JITTER, 1 + SYNC_JITTER))
 
 
 def already_running():
@@ -203,8 +1471,11 @@ def main():
     if already_running():
         return
 
-    threading.Thread(target=discovery_broadcast, daemon=True).start()
-    threading.Thread(target=discovery_listener, daemon=True).start()
+    load_peers()
+    threading.Thread(target=persist_peers_loop, daemon=True).start()
+    if DISCOVERY_PORT:
+        threading.Thread(target=discovery_broadcast, daemon=True).start()
+        threading.Thread(target=discovery_listener, daemon=True).start()
     threading.Thread(target=sync_loop, daemon=True).start()
 
     httpd = ThreadingHTTPServer(("0.0.0.0", NODE_PORT), Handler)
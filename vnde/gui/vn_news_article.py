@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# Offline reading for VN News: pull the main text out of article pages (readability-style scoring)
+# and keep it in a gzip-compressed, size-capped LRU under ~/.cache/vnde/news/articles.
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from html.parser import HTMLParser
+
+from vn_news_service import CACHE_DIR, FETCH_TIMEOUT, download
+
+ARTICLE_DIR = os.path.join(CACHE_DIR, "articles")
+ARTICLE_CACHE_MAX = 40 * 1024 * 1024
+ARTICLE_MAX_BYTES = 3 * 1024 * 1024
+MIN_PARAGRAPH = 25
+
+SKIP_TAGS = {
+    "script", "style", "noscript", "template", "nav", "header", "footer", "aside", "form",
+    "iframe", "svg", "button", "select", "textarea", "figcaption",
+}
+TEXT_TAGS = {"p", "h1", "h2", "h3", "h4", "li", "blockquote", "pre", "td"}
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param",
+    "source", "track", "wbr",
+}
+POSITIVE_RE = re.compile(r"article|body|content|entry|main|post|story|text|detail|fck|normal", re.I)
+NEGATIVE_RE = re.compile(
+    r"comment|footer|sidebar|menu|nav|share|social|related|banner|ads?\b|promo|breadcrumb|tag|widget|popup",
+    re.I,
+)
+CHARSET_RE = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.I)
+
+PRUNE_LOCK = threading.Lock()
+
+
+class Node:
+    __slots__ = ("tag", "hint", "parent", "children")
+
+    def __init__(self, tag, hint, parent):
+        self.tag = tag
+        self.hint = hint
+        self.parent = parent
+        self.children = []
+
+
+class TreeBuilder(HTMLParser):
+    # Just enough of a DOM for scoring: tags, class/id, text. Tolerates unclosed <p>/<li>.
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node("root", "", None)
+        self.stack = [self.root]
+        self.images = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "br":
+            self.stack[-1].children.append("\n")
+            return
+        if tag == "img":
+            src = dict(attrs).get("src") or ""
+            if src.startswith(("http://", "https://")):
+                self.images.append(src)
+            return
+        if tag in VOID_TAGS:
+            return
+        if tag in ("p", "li") and self.stack[-1].tag == tag:
+            self.stack.pop()
+        a = dict(attrs)
+        node = Node(tag, f"{a.get('class') or ''} {a.get('id') or ''}", self.stack[-1])
+        self.stack[-1].children.append(node)
+        self.stack.append(node)
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                return
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+
+def text_of(node, links=None, breaks=False):
+    parts = []
+    for child in node.children:
+        if isinstance(child, str):
+            parts.append(child)
+        elif child.tag not in SKIP_TAGS:
+            inner = text_of(child, links, breaks)
+            if links is not None and child.tag == "a":
+                links.append(len(inner))
+            if breaks and (child.tag in TEXT_TAGS or child.tag == "div"):
+                inner = f"\n{inner}\n"
+            parts.append(inner)
+    return "".join(parts)
+
+
+def clean(text):
+    lines = (" ".join(line.split()) for line in text.split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def link_density(node):
+    links = []
+    text = clean(text_of(node, links))
+    return (sum(links) / len(text)) if text else 1.0
+
+
+def class_weight(node):
+    weight = 0
+    if node.hint.strip():
+        if NEGATIVE_RE.search(node.hint):
+            weight -= 25
+        if POSITIVE_RE.search(node.hint):
+            weight += 25
+    if node.tag in ("article", "main"):
+        weight += 25
+    return weight
+
+
+def iter_nodes(node):
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        if n.tag in SKIP_TAGS:
+            continue
+        yield n
+        stack.extend(reversed([c for c in n.children if not isinstance(c, str)]))
+
+
+def paragraphs(node):
+    out = []
+    for n in iter_nodes(node):
+        if n.tag not in TEXT_TAGS:
+            continue
+        # Skip blocks that only wrap other text blocks; their children are visited anyway.
+        if any(not isinstance(c, str) and c.tag in TEXT_TAGS for c in n.children):
+            continue
+        text = clean(text_of(n))
+        if not text:
+            continue
+        if n.tag.startswith("h") or (len(text) >= MIN_PARAGRAPH and link_density(n) < 0.5):
+            out.append(text)
+    return out
+
+
+def extract_text(html):
+    # Score each container by the paragraphs directly under it (and half for the grandparent),
+    # then keep the best-scoring container's paragraphs. The classic readability heuristic.
+    builder = TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    scores = {}
+    for n in iter_nodes(builder.root):
+        if n.tag not in ("p", "pre", "td", "blockquote"):
+            continue
+        text = clean(text_of(n))
+        if len(text) < MIN_PARAGRAPH:
+            continue
+        score = 1 + text.count(",") + min(len(text) // 100, 3)
+        for parent, share in ((n.parent, 1.0), (n.parent.parent if n.parent else None, 0.5)):
+            if parent is None or parent.tag == "root":
+                continue
+            if parent not in scores:
+                scores[parent] = class_weight(parent)
+            scores[parent] += score * share
+    if not scores:
+        return "\n\n".join(paragraphs(builder.root))
+    best = max(scores, key=lambda n: scores[n] * (1 - link_density(n)))
+    return "\n\n".join(paragraphs(best))
+
+
+def summary_fields(html):
+    # Feed summaries are small HTML fragments (VnExpress wraps a thumbnail link around the text).
+    # Returns (plain text, first image URL); called once per entry when a feed is downloaded.
+    if "<" not in html and "&" not in html:
+        return " ".join(html.split()), ""
+    builder = TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return clean(text_of(builder.root, breaks=True)), (builder.images[0] if builder.images else "")
+
+
+def decode_html(body, content_type=""):
+    match = re.search(r"charset=([\w-]+)", content_type or "", re.I)
+    charset = match.group(1) if match else None
+    if charset is None:
+        meta = CHARSET_RE.search(body[:4096])
+        charset = meta.group(1).decode("ascii", "ignore") if meta else "utf-8"
+    try:
+        return body.decode(charset, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+def article_path(link):
+    return os.path.join(ARTICLE_DIR, hashlib.sha1(link.encode("utf-8")).hexdigest() + ".json.gz")
+
+
+def load_article(link):
+    path = article_path(link)
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    try:
+        # mtime doubles as the LRU clock.
+        os.utime(path)
+    except OSError:
+        pass
+    return record
+
+
+def save_article(record):
+    os.makedirs(ARTICLE_DIR, exist_ok=True)
+    path = article_path(record["url"])
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+        json.dump(record, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    prune_articles()
+
+
+def prune_articles(limit=ARTICLE_CACHE_MAX):
+    # Drop least recently read articles until the cache fits, leaving some headroom.
+    with PRUNE_LOCK:
+        try:
+            files = [e for e in os.scandir(ARTICLE_DIR) if e.name.endswith(".json.gz") and e.is_file()]
+        except OSError:
+            return
+        stats = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in files]
+        total = sum(s[1] for s in stats)
+        if total <= limit:
+            return
+        for _mtime, size, path in sorted(stats):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= limit * 0.9:
+                return
+
+
+def fetch_article(link, timeout=FETCH_TIMEOUT):
+    status, body, headers = download(link, timeout=timeout, max_bytes=ARTICLE_MAX_BYTES)
+    if status != 200 or not body:
+        raise OSError(f"article fetch failed: HTTP {status}")
+    text = extract_text(decode_html(body, headers.get("Content-Type", "")))
+    record = {"url": link, "text": text, "fetched_ts": int(time.time())}
+    save_article(record)
+    return record
+
+
+def get_article(link, fetch=True, timeout=FETCH_TIMEOUT):
+    record = load_article(link)
+    if record is None and fetch:
+        record = fetch_article(link, timeout)
+    return record
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# Offline check for vn_news_article.py: serves fixtures/ from a local http.server and exercises
+# extraction, the reading cache, the size cap, a 404 and LRU pruning. Exits non-zero on failure.
+#
+#   python3 vn_news_article_check.py
+import functools
+import http.server
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(HERE, "fixtures")
+FAILURES = []
+
+
+def check(name, ok, detail=""):
+    print(f"{'ok  ' if ok else 'FAIL'} {name}" + (f": {detail}" if detail and not ok else ""))
+    if not ok:
+        FAILURES.append(name)
+
+
+def serve(root):
+    handler = functools.partial(QuietHandler, directory=root)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *_args):
+        pass
+
+
+def main():
+    tmp = tempfile.mkdtemp(prefix="vn-news-check-")
+    # The cache paths are derived from $HOME when the modules load, so point it away first.
+    os.environ["HOME"] = os.path.join(tmp, "home")
+    sys.path.insert(0, HERE)
+    import vn_news_article as art
+
+    site = os.path.join(tmp, "site")
+    shutil.copytree(FIXTURES, site)
+    with open(os.path.join(site, "huge.html"), "wb") as f:
+        f.write(b"<p>" + b"x" * (art.ARTICLE_MAX_BYTES + 1) + b"</p>")
+    server, base = serve(site)
+    try:
+        link = f"{base}/news_article.html"
+        record = art.get_article(link)
+        text = record["text"] if record else ""
+        check("article paragraphs kept", "tong chieu dai gan 60 km" in text and "250 km" in text, text)
+        check("headline kept", text.startswith("Ha Noi mo them tuyen xe buyt dien"), text[:80])
+        for label, needle in (
+            ("nav", "Kinh doanh"),
+            ("sidebar", "BRT"),
+            ("ads", "Quang cao"),
+            ("comments", "Ban doc B"),
+            ("footer", "Giay phep"),
+            ("figcaption", "Anh: Fixture"),
+            ("script", "analytics"),
+        ):
+            check(f"{label} dropped", needle not in text)
+        check("cached on disk", os.path.exists(art.article_path(link)))
+
+        try:
+            art.get_article(f"{base}/missing.html")
+            check("404 raises", False, "no exception")
+        except OSError:
+            check("404 raises", True)
+        check("404 not cached", art.load_article(f"{base}/missing.html") is None)
+
+        try:
+            art.fetch_article(f"{base}/huge.html")
+            check("size cap", False, "oversized page accepted")
+        except ValueError:
+            check("size cap", True)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    cached = art.get_article(link, fetch=False)
+    check("served from cache with the server gone", cached is not None and cached["text"] == text)
+
+    # LRU: five records, the oldest one read recently; pruning to three must drop the two stalest unread.
+    now = time.time()
+    links = [f"http://lru.invalid/{i}" for i in range(5)]
+    for i, url in enumerate(links):
+        art.save_article({"url": url, "text": "y" * 20000, "fetched_ts": 0})
+        os.utime(art.article_path(url), (now - 100 + i, now - 100 + i))
+    art.load_article(links[0])
+    sizes = [os.path.getsize(art.article_path(url)) for url in links]
+    os.remove(art.article_path(link))
+    art.prune_articles(limit=int(sum(sizes[:3]) / 0.9) + 1)
+    kept = [url for url in links if os.path.exists(art.article_path(url))]
+    check("LRU keeps recently read", links[0] in kept, kept)
+    check("LRU drops least recently read", links[1] not in kept and links[2] not in kept, kept)
+
+    shutil.rmtree(tmp, ignore_errors=True)
+    print("all checks passed" if not FAILURES else f"{len(FAILURES)} check(s) failed")
+    sys.exit(1 if FAILURES else 0)
+
+
+if __name__ == "__main__":
+    main()
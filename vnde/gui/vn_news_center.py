@@ -1,25 +1,26 @@
 #!/usr/bin/env python3
 import datetime
 import threading
+import time
 import webbrowser
-from html import unescape
 
 import gi
 
 gi.require_version("Gtk", "4.0")
-from gi.repository import Gdk, GLib, Gtk
+from gi.repository import Gdk, Gio, GLib, GObject, Gtk
 
-try:
-    import feedparser
-except Exception:
-    feedparser = None
+from vn_news_service import (
+    ALL_SOURCE,
+    FEEDS,
+    ensure_service,
+    get_article,
+    get_entries,
+    have_feedparser,
+    watch_updates,
+)
+from vn_text import fold_text
 
-FEEDS = {
-    "VnExpress": "https://vnexpress.net/rss/tin-moi-nhat.rss",
-    "Tuoi Tre": "https://tuoitre.vn/rss/tin-moi-nhat.rss",
-    "Thanh Nien": "https://thanhnien.vn/rss/home.rss",
-    "Dan Tri": "https://dantri.com.vn/rss/home.rss",
-}
+WATCH_RETRY = 30
 
 CSS = """
 window { background: #0f1115; }
@@ -43,10 +44,43 @@ def apply_css():
     )
 
 
+class NewsItem(GObject.Object):
+    # Everything a row or the filter needs is computed once, when the entry arrives.
+    def __init__(self, entry):
+        super().__init__()
+        self.entry = entry
+        self.search_key = fold_text(entry.get("title", ""))
+        text = " ".join((entry.get("summary") or "").split())[:140]
+        self.snippet = f"{entry['source']} | {text}" if entry.get("source") else text
+
+
+class NewsRow(Gtk.Box):
+    def __init__(self):
+        super().__init__(orientation=Gtk.Orientation.VERTICAL, spacing=4)
+        self.set_margin_top(8)
+        self.set_margin_bottom(8)
+        self.set_margin_start(10)
+        self.set_margin_end(10)
+        self.title = Gtk.Label(xalign=0)
+        self.title.set_wrap(True)
+        self.title.add_css_class("news-title")
+        self.summary = Gtk.Label(xalign=0)
+        self.summary.set_wrap(True)
+        self.summary.add_css_class("dim-label")
+        self.append(self.title)
+        self.append(self.summary)
+
+    def bind(self, item):
+        self.title.set_label(item.entry.get("title", ""))
+        self.summary.set_label(item.snippet)
+
+
 class VNNews(Gtk.Application):
     def __init__(self):
         super().__init__(application_id="vn.de.news")
-        self.items = []
+        self.store = Gio.ListStore(item_type=NewsItem)
+        self.term = ""
+        self.load_gen = 0
 
     def do_activate(self):
         apply_css()
@@ -71,13 +105,13 @@ class VNNews(Gtk.Application):
         hero.append(s)
 
         top = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10)
-        self.source = Gtk.DropDown.new_from_strings(list(FEEDS.keys()))
-        self.source.connect("notify::selected", self.reload)
+        self.source = Gtk.DropDown.new_from_strings([ALL_SOURCE] + list(FEEDS.keys()))
+        self.source.connect("notify::selected", self.on_source_changed)
         self.search = Gtk.SearchEntry(placeholder_text="Tim tieu de bai viet...")
-        self.search.connect("search-changed", self.render)
+        self.search.connect("search-changed", self.on_search_changed)
         btn = Gtk.Button(label="Lam moi")
         btn.add_css_class("suggested-action")
-        btn.connect("clicked", self.reload)
+        btn.connect("clicked", self.on_refresh)
         self.status = Gtk.Label(label="San sang", xalign=1)
         self.status.add_css_class("status")
         top.append(self.source)
@@ -87,14 +121,21 @@ class VNNews(Gtk.Application):
 
         body = Gtk.Paned.new(Gtk.Orientation.HORIZONTAL)
 
-        self.listbox = Gtk.ListBox()
-        self.listbox.add_css_class("leftlist")
-        self.listbox.set_selection_mode(Gtk.SelectionMode.SINGLE)
-        self.listbox.connect("row-selected", self.on_select)
+        # Only visible rows get widgets; typing re-filters the model instead of rebuilding rows.
+        self.filter = Gtk.CustomFilter.new(self.match_item)
+        self.filtered = Gtk.FilterListModel(model=self.store, filter=self.filter)
+        self.selection = Gtk.SingleSelection(model=self.filtered)
+        self.selection.set_autoselect(False)
+        self.selection.connect("notify::selected-item", self.on_select)
+        factory = Gtk.SignalListItemFactory()
+        factory.connect("setup", lambda _f, li: li.set_child(NewsRow()))
+        factory.connect("bind", lambda _f, li: li.get_child().bind(li.get_item()))
+        self.listview = Gtk.ListView(model=self.selection, factory=factory)
+        self.listview.add_css_class("leftlist")
 
         left_sc = Gtk.ScrolledWindow()
         left_sc.set_min_content_width(520)
-        left_sc.set_child(self.listbox)
+        left_sc.set_child(self.listview)
         left_wrap = Gtk.Box()
         left_wrap.add_css_class("list-pane")
         left_wrap.append(left_sc)
@@ -133,86 +174,125 @@ class VNNews(Gtk.Application):
         self.win.maximize()
         self.win.present()
         self.reload()
+        threading.Thread(target=self.watch_service, daemon=True).start()
 
     def set_status(self, text):
         self.status.set_label(text)
 
-    def reload(self, *_args):
-        if feedparser is None:
-            self.set_status("Thieu python3-feedparser")
-            return
+    def on_source_changed(self, *_args):
+        self.reload()
 
-        src = self.source.get_selected_item().get_string()
-        url = FEEDS[src]
-        self.set_status(f"Dang tai {src}...")
+    def on_refresh(self, _btn):
+        self.reload(force=True)
 
-        def worker():
-            feed = feedparser.parse(url)
-            entries = []
-            for e in feed.entries[:100]:
-                entries.append(
-                    {
-                        "title": unescape(getattr(e, "title", "(Khong tieu de)")),
-                        "summary": unescape(getattr(e, "summary", "")),
-                        "link": getattr(e, "link", ""),
-                    }
-                )
-            GLib.idle_add(self.load_entries, src, entries)
+    def selected_source(self):
+        return self.source.get_selected_item().get_string()
 
-        threading.Thread(target=worker, daemon=True).start()
+    def reload(self, force=False):
+        # Cached entries come back from the news service at once; a fetch only follows when
+        # they are stale or on "Lam moi".
+        src = self.selected_source()
+        self.load_gen += 1
+        gen = self.load_gen
 
-    def load_entries(self, src, entries):
-        self.items = entries
-        self.render()
-        now = datetime.datetime.now().strftime("%H:%M")
-        self.set_status(f"{src}: {len(entries)} tin | cap nhat {now}")
+        def worker():
+            data = get_entries(src)
+            GLib.idle_add(self.on_entries, gen, data)
+            if force or data.get("stale"):
+                GLib.idle_add(self.set_status, f"Dang tai {src}...")
+                data = get_entries(src, refresh="force" if force else "stale")
+                GLib.idle_add(self.on_entries, gen, data)
 
-    def render(self, *_args):
-        term = self.search.get_text().strip().lower() if hasattr(self, "search") else ""
+        threading.Thread(target=worker, daemon=True).start()
 
+    def on_entries(self, gen, data):
+        if gen != self.load_gen:
+            return False
+        self.set_entries(data.get("entries", []))
+        self.set_status(self.status_text(data))
+        return False
+
+    def status_text(self, data):
+        src = data.get("source", "")
+        failed = data.get("failed", [])
+        count = self.store.get_n_items()
+        if not count and failed and not have_feedparser():
+            return "Thieu python3-feedparser"
+        if not count and failed:
+            return f"Khong tai duoc {src}"
+        when = datetime.datetime.fromtimestamp(data.get("fetched_ts", 0)).strftime("%H:%M")
+        note = ""
+        if failed:
+            note = f" (loi: {', '.join(failed)})" if src == ALL_SOURCE else " (loi mang, ban luu)"
+        return f"{src}: {count} tin | cap nhat {when}{note}"
+
+    def watch_service(self):
+        # The service refreshes feeds for the whole desktop; reload whenever it reports new content.
+        version = None
         while True:
-            row = self.listbox.get_row_at_index(0)
-            if row is None:
-                break
-            self.listbox.remove(row)
-
-        for item in self.items:
-            if term and term not in item["title"].lower():
-                continue
-            row = Gtk.ListBoxRow()
-            box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=4)
-            box.set_margin_top(8)
-            box.set_margin_bottom(8)
-            box.set_margin_start(10)
-            box.set_margin_end(10)
-
-            title = Gtk.Label(label=item["title"], xalign=0)
-            title.set_wrap(True)
-            title.add_css_class("news-title")
-
-            summary = Gtk.Label(label=(item["summary"] or "").replace("\n", " ")[:140], xalign=0)
-            summary.set_wrap(True)
-            summary.add_css_class("dim-label")
-
-            box.append(title)
-            box.append(summary)
-            row.set_child(box)
-            row._vnde_item = item
-            self.listbox.append(row)
-
-    def on_select(self, _lb, row):
-        if row is None or not hasattr(row, "_vnde_item"):
+            try:
+                reply = watch_updates(version)
+                if reply.get("changed"):
+                    GLib.idle_add(self.reload)
+                version = reply.get("version")
+            except OSError:
+                if not ensure_service():
+                    time.sleep(WATCH_RETRY)
+
+    def set_entries(self, entries):
+        self.store.splice(0, self.store.get_n_items(), [NewsItem(e) for e in entries])
+
+    def match_item(self, item):
+        return not self.term or self.term in item.search_key
+
+    def on_search_changed(self, entry):
+        term = fold_text(entry.get_text().strip())
+        if term == self.term:
+            return
+        # Tell GTK which way the filter moved so it only rechecks the rows that can change.
+        if self.term and self.term in term:
+            change = Gtk.FilterChange.MORE_STRICT
+        elif term and term in self.term:
+            change = Gtk.FilterChange.LESS_STRICT
+        else:
+            change = Gtk.FilterChange.DIFFERENT
+        self.term = term
+        self.filter.changed(change)
+
+    def selected_entry(self):
+        item = self.selection.get_selected_item()
+        return item.entry if item is not None else None
+
+    def on_select(self, *_args):
+        item = self.selected_entry()
+        if item is None:
             return
-        item = row._vnde_item
         self.detail_title.set_label(item["title"])
         self.detail_text.set_label(item["summary"] or "(Khong co tom tat)")
         self.open_btn.set_sensitive(bool(item.get("link")))
+        link = item.get("link")
+        if not link:
+            return
+
+        # Prefetched articles come straight from the reading cache; others are fetched now.
+        def worker():
+            article = get_article(link)
+            if article and article.get("text"):
+                GLib.idle_add(self.on_article, link, article["text"])
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def on_article(self, link, text):
+        item = self.selected_entry()
+        if item is not None and item.get("link") == link:
+            self.detail_text.set_label(text)
+        return False
 
     def open_link(self, _btn):
-        row = self.listbox.get_selected_row()
-        if row is None or not hasattr(row, "_vnde_item"):
+        item = self.selected_entry()
+        if item is None:
             return
-        link = row._vnde_item.get("link")
+        link = item.get("link")
         if link:
             webbrowser.open(link)
 
@@ -0,0 +1,566 @@
+#!/usr/bin/env python3
+# VN News feed service: one per user, owns fetching/caching; GUI, CLI and panel talk to it over a socket.
+# Only cheap modules are imported up front so thin clients start in milliseconds; feedparser, urllib
+# and friends are pulled in by the code paths that actually download.
+import gzip
+import hashlib
+import importlib.util
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+
+FEEDS = {
+    "VnExpress": "https://vnexpress.net/rss/tin-moi-nhat.rss",
+    "Tuoi Tre": "https://tuoitre.vn/rss/tin-moi-nhat.rss",
+    "Thanh Nien": "https://thanhnien.vn/rss/home.rss",
+    "Dan Tri": "https://dantri.com.vn/rss/home.rss",
+}
+
+ALL_SOURCE = "Tat ca"
+
+CACHE_DIR = os.path.expanduser("~/.cache/vnde/news")
+FEED_TTL = 600
+MAX_ENTRIES = 100
+# Bump when the shape of cached entries changes; older caches are re-downloaded in full.
+CACHE_FORMAT = 2
+MERGED_MAX = 400
+FETCH_WORKERS = 4
+FETCH_TIMEOUT = 10
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) VNDE-News/1.0"
+SOCKET_PATH = os.path.join(os.environ.get("XDG_RUNTIME_DIR") or CACHE_DIR, "vnde-news.sock")
+SERVICE_LOG = os.path.join(CACHE_DIR, "service.log")
+SERVICE_TIMEOUT = 2.0
+SERVICE_START_WAIT = 3.0
+WATCH_TIMEOUT = 25
+REFRESH_MIN_SLEEP = 30
+# Background rounds only run while someone is using the news (the GUI long-polls watch every
+# WATCH_TIMEOUT, the panel asks for entries every 30 minutes); a daemon nobody talks to exits.
+CLIENT_IDLE = 900
+SERVICE_IDLE_EXIT = 3600
+PAUSE_POLL = 300
+ARTICLE_PREFETCH = 8
+
+# url -> lock, so a prefetch and a click never download the same feed twice at once.
+URL_LOCKS = {}
+URL_LOCKS_GUARD = threading.Lock()
+
+# cache path -> (mtime_ns, parsed cache), so repeated reads of an unchanged feed skip the JSON parse.
+CACHE_MEMO = {}
+
+# Bumped whenever a feed download brings new content; "watch" clients long-poll on it.
+UPDATED = threading.Condition()
+VERSION = 0
+LAST_CLIENT = time.monotonic()
+
+_feedparser = None
+
+
+def have_feedparser():
+    return _feedparser is not None or importlib.util.find_spec("feedparser") is not None
+
+
+def load_feedparser():
+    global _feedparser
+    if _feedparser is None:
+        try:
+            import feedparser
+
+            _feedparser = feedparser
+        except Exception:
+            return None
+    return _feedparser
+
+
+def feed_cache_path(url):
+    return os.path.join(CACHE_DIR, hashlib.sha1(url.encode("utf-8")).hexdigest()[:16] + ".json")
+
+
+def load_feed_cache(url):
+    path = feed_cache_path(url)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        memo = CACHE_MEMO.get(path)
+        if memo is not None and memo[0] == mtime:
+            return memo[1]
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            return None
+        CACHE_MEMO[path] = (mtime, data)
+        return data
+    except Exception:
+        return None
+
+
+def save_feed_cache(url, data):
+    # Write-then-rename so a reader never sees a half-written file.
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = feed_cache_path(url)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def entry_time(e):
+    import calendar
+
+    for key in ("published_parsed", "updated_parsed"):
+        parsed = e.get(key)
+        if parsed:
+            return calendar.timegm(parsed)
+    return 0
+
+
+def media_image(e):
+    for thumb in e.get("media_thumbnail") or []:
+        if thumb.get("url"):
+            return thumb["url"]
+    for media in e.get("media_content") or []:
+        if media.get("url") and (media.get("medium") == "image" or media.get("type", "").startswith("image/")):
+            return media["url"]
+    for enc in e.get("enclosures") or []:
+        if enc.get("href") and enc.get("type", "").startswith("image/"):
+            return enc["href"]
+    return ""
+
+
+def parse_entries(feed, previous=None):
+    # Summaries are turned into plain text (plus a lead image) here, once per entry: an entry whose
+    # raw summary hashes the same as in the previous cache reuses the earlier result.
+    from html import unescape
+
+    from vn_news_article import summary_fields
+
+    known = {}
+    if previous and previous.get("format") == CACHE_FORMAT:
+        known = {e["id"]: e for e in previous.get("entries", [])}
+    entries = []
+    for e in feed.entries[:MAX_ENTRIES]:
+        title = unescape(e.get("title", "(Khong tieu de)"))
+        link = e.get("link", "")
+        entry_id = e.get("id") or link or hashlib.sha1(title.encode("utf-8")).hexdigest()
+        raw = e.get("summary", "")
+        digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+        old = known.get(entry_id)
+        if old is not None and old.get("summary_hash") == digest:
+            summary, image = old["summary"], old["image"]
+        else:
+            summary, image = summary_fields(raw)
+            image = media_image(e) or image
+        entries.append(
+            {
+                "id": entry_id,
+                "title": title,
+                "summary": summary,
+                "summary_hash": digest,
+                "image": image,
+                "link": link,
+                "published_ts": entry_time(e),
+            }
+        )
+    return entries
+
+
+def is_fresh(cache, ttl=FEED_TTL):
+    return cache is not None and cache.get("format") == CACHE_FORMAT and time.time() - float(cache.get("checked_ts", 0)) < ttl
+
+
+def url_lock(url):
+    with URL_LOCKS_GUARD:
+        return URL_LOCKS.setdefault(url, threading.Lock())
+
+
+def mark_updated():
+    global VERSION
+    with UPDATED:
+        VERSION += 1
+        UPDATED.notify_all()
+
+
+def download(url, etag="", modified="", timeout=FETCH_TIMEOUT, max_bytes=None):
+    # Conditional GET with a hard timeout; returns (status, body, headers), body None on 304.
+    import urllib.error
+    import urllib.request
+
+    headers = {"User-Agent": USER_AGENT, "Accept-Encoding": "gzip"}
+    if etag:
+        headers["If-None-Match"] = etag
+    if modified:
+        headers["If-Modified-Since"] = modified
+    req = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as r:
+            body = r.read(max_bytes + 1) if max_bytes else r.read()
+            if max_bytes and len(body) > max_bytes:
+                raise ValueError(f"response larger than {max_bytes} bytes")
+            if r.headers.get("Content-Encoding", "") == "gzip":
+                body = gzip.decompress(body)
+            return r.status, body, r.headers
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return 304, None, e.headers
+        raise
+
+
+def fetch_feed(url, force=False, ttl=FEED_TTL, timeout=FETCH_TIMEOUT):
+    # Returns (cache, status): "cache" within the TTL, "304" when the server says unchanged,
+    # "200" for a fresh download, "error" when the fetch failed and the old cache is returned.
+    with url_lock(url):
+        cache = load_feed_cache(url)
+        if not force and is_fresh(cache, ttl):
+            return cache, "cache"
+        feedparser = load_feedparser()
+        if feedparser is None:
+            return cache, "error"
+        try:
+            # An old-format cache still serves as a fallback, but its validators would get a 304
+            # and leave the entries unconverted, so ask for the full feed.
+            validators = cache if cache and cache.get("format") == CACHE_FORMAT else {}
+            status, body, headers = download(url, validators.get("etag", ""), validators.get("modified", ""), timeout)
+            now = int(time.time())
+            if status == 304 and validators:
+                cache["checked_ts"] = now
+                save_feed_cache(url, cache)
+                return cache, "304"
+            feed = feedparser.parse(body or b"", response_headers={"content-type": headers.get("Content-Type", "")})
+        except Exception:
+            return cache, "error"
+        if not feed.entries:
+            # Broken XML or an error page; keep serving what we had.
+            return cache, "error"
+        cache = {
+            "format": CACHE_FORMAT,
+            "url": url,
+            "etag": headers.get("ETag", ""),
+            "modified": headers.get("Last-Modified", ""),
+            "fetched_ts": now,
+            "checked_ts": now,
+            "entries": parse_entries(feed, cache),
+        }
+        save_feed_cache(url, cache)
+        mark_updated()
+        return cache, "200"
+
+
+def fetch_all(force=False, on_result=None, feeds=None, workers=FETCH_WORKERS, timeout=FETCH_TIMEOUT):
+    # Refresh every feed on a bounded pool; each has its own timeout so a slow site only delays itself.
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    feeds = feeds or FEEDS
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vnnews-fetch") as pool:
+        jobs = {pool.submit(fetch_feed, url, force, FEED_TTL, timeout): name for name, url in feeds.items()}
+        for fut in as_completed(jobs):
+            name = jobs[fut]
+            try:
+                cache, status = fut.result()
+            except Exception:
+                cache, status = load_feed_cache(feeds[name]), "error"
+            results[name] = (cache, status)
+            if on_result is not None:
+                on_result(name, cache, status)
+    return results
+
+
+def merged_entries(caches, limit=MERGED_MAX):
+    # One timeline across sources, newest first; the same story linked twice is shown once.
+    seen = set()
+    merged = []
+    for name, cache in caches.items():
+        for e in (cache or {}).get("entries", []):
+            key = e.get("link") or e.get("id")
+            title_key = " ".join(e.get("title", "").lower().split())
+            if key in seen or title_key in seen:
+                continue
+            seen.add(key)
+            seen.add(title_key)
+            merged.append(dict(e, source=name))
+    merged.sort(key=lambda e: e.get("published_ts", 0), reverse=True)
+    return merged[:limit]
+
+
+def load_all_caches(feeds=None):
+    feeds = feeds or FEEDS
+    return {name: load_feed_cache(url) for name, url in feeds.items()}
+
+
+def local_entries(source, refresh=None, limit=None, since=0):
+    # refresh: None reads the cache only, "stale" fetches past the TTL, "force" always revalidates.
+    failed = []
+    if source == ALL_SOURCE:
+        if refresh:
+            results = fetch_all(force=refresh == "force")
+            caches = {name: cache for name, (cache, _state) in results.items()}
+            failed = sorted(name for name, (_cache, state) in results.items() if state == "error")
+        else:
+            caches = load_all_caches()
+        entries = merged_entries(caches)
+        fetched = [c.get("fetched_ts", 0) for c in caches.values() if c]
+        stale = not fetched or any(not is_fresh(c) for c in caches.values())
+    elif source in FEEDS:
+        if refresh:
+            cache, state = fetch_feed(FEEDS[source], force=refresh == "force")
+            if state == "error":
+                failed = [source]
+        else:
+            cache = load_feed_cache(FEEDS[source])
+        entries = (cache or {}).get("entries", [])
+        fetched = [cache.get("fetched_ts", 0)] if cache else []
+        stale = not is_fresh(cache)
+    else:
+        raise ValueError(f"unknown source: {source}")
+    if since:
+        entries = [e for e in entries if e.get("published_ts", 0) > since]
+    if limit:
+        entries = entries[:limit]
+    return {"source": source, "entries": entries, "fetched_ts": max(fetched or [0]), "failed": failed, "stale": stale}
+
+
+def local_article(link, fetch=True):
+    from vn_news_article import get_article
+
+    return get_article(link, fetch)
+
+
+def prefetch_articles(limit=ARTICLE_PREFETCH):
+    # Warm the reading cache with the newest few stories of every feed. Whole pages are much
+    # bigger than feeds, so never on a metered link.
+    from concurrent.futures import ThreadPoolExecutor
+
+    from vn_news_article import article_path
+    from vn_power import metered
+
+    if metered():
+        return
+    links = []
+    for cache in load_all_caches().values():
+        for e in (cache or {}).get("entries", [])[:limit]:
+            # exists() rather than load_article(): reading would bump the LRU clock of unread pages.
+            if e.get("link") and not os.path.exists(article_path(e["link"])):
+                links.append(e["link"])
+
+    def fetch(link):
+        try:
+            local_article(link)
+        except Exception:
+            pass
+
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="vnnews-article") as pool:
+        list(pool.map(fetch, links))
+
+
+def service_call(request, timeout=SERVICE_TIMEOUT):
+    # One JSON line each way; raises OSError when no service is listening.
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(SOCKET_PATH)
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        buf = b""
+        while not buf.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            buf += chunk
+    try:
+        reply = json.loads(buf.decode("utf-8"))
+    except ValueError as e:
+        raise OSError(f"bad reply from news service: {e}") from e
+    if not reply.get("ok"):
+        raise OSError(reply.get("error", "news service error"))
+    return reply
+
+
+def service_running():
+    try:
+        service_call({"cmd": "ping"}, timeout=0.5)
+        return True
+    except OSError:
+        return False
+
+
+def start_service():
+    # Spawn the service without waiting for it; it refreshes every feed as soon as it is up.
+    if not have_feedparser():
+        return False
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(SERVICE_LOG, "ab") as log:
+            subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__)],
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=log,
+                start_new_session=True,
+            )
+    except OSError:
+        # Callers fall back to working in-process; never let a spawn problem escape into them.
+        return False
+    return True
+
+
+def ensure_service():
+    if service_running():
+        return True
+    if not start_service():
+        return False
+    deadline = time.time() + SERVICE_START_WAIT
+    while time.time() < deadline:
+        if service_running():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def get_entries(source, refresh=None, limit=None, since=0, timeout=None):
+    # Ask the service; without one (not installed, failed to start) do the same work in-process.
+    request = {"cmd": "entries", "source": source, "refresh": refresh, "limit": limit, "since": since}
+    wait = timeout or (FETCH_TIMEOUT * 2 + SERVICE_TIMEOUT if refresh else SERVICE_TIMEOUT)
+    try:
+        return service_call(request, wait)
+    except OSError:
+        return local_entries(source, refresh, limit, since)
+
+
+def get_article(link, fetch=True):
+    # Returns {"url", "text", "fetched_ts"} or None; never raises for network trouble.
+    try:
+        return service_call({"cmd": "article", "link": link, "fetch": fetch}, FETCH_TIMEOUT + SERVICE_TIMEOUT)["article"]
+    except OSError:
+        pass
+    try:
+        return local_article(link, fetch)
+    except Exception:
+        return None
+
+
+def request_refresh(sources):
+    # Fire-and-forget: the caller keeps showing the cache, listeners hear about new entries via watch.
+    try:
+        return service_call({"cmd": "refresh", "sources": list(sources)})["started"]
+    except OSError:
+        return list(FEEDS) if start_service() else []
+
+
+def watch_updates(since, timeout=WATCH_TIMEOUT):
+    return service_call({"cmd": "watch", "since": since, "timeout": timeout}, timeout + SERVICE_TIMEOUT)
+
+
+class ServiceHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode("utf-8"))
+            reply = self.dispatch(request)
+            reply["ok"] = True
+        except Exception as e:
+            reply = {"ok": False, "error": str(e)}
+        self.wfile.write(json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def dispatch(self, request):
+        cmd = request.get("cmd")
+        if cmd == "ping":
+            return {"version": VERSION, "pid": os.getpid()}
+        if cmd == "sources":
+            return {"sources": [ALL_SOURCE] + list(FEEDS)}
+        if cmd in ("entries", "watch", "refresh"):
+            touch_client()
+        if cmd == "entries":
+            refresh = request.get("refresh")
+            if refresh not in (None, "stale", "force"):
+                raise ValueError("refresh must be null, stale or force")
+            limit = int(request.get("limit") or 0) or None
+            return local_entries(request.get("source", ALL_SOURCE), refresh, limit, int(request.get("since") or 0))
+        if cmd == "article":
+            link = str(request.get("link") or "")
+            if not link.startswith(("http://", "https://")):
+                raise ValueError("link must be an http(s) URL")
+            try:
+                return {"article": local_article(link, bool(request.get("fetch", True)))}
+            except Exception as e:
+                # A dead article link is an answer, not a service failure; don't make the client retry.
+                return {"article": None, "error": str(e)}
+        if cmd == "refresh":
+            names = request.get("sources") or [ALL_SOURCE]
+            feeds = FEEDS if ALL_SOURCE in names else {n: FEEDS[n] for n in names if n in FEEDS}
+            if feeds:
+                threading.Thread(target=fetch_all, kwargs={"feeds": feeds}, daemon=True).start()
+            return {"started": list(feeds)}
+        if cmd == "watch":
+            since = request.get("since")
+            timeout = max(0.0, min(float(request.get("timeout", WATCH_TIMEOUT)), 60.0))
+            with UPDATED:
+                if since is not None:
+                    UPDATED.wait_for(lambda: VERSION > int(since), timeout)
+                return {"version": VERSION, "changed": since is not None and VERSION > int(since)}
+        raise ValueError(f"unknown command: {cmd}")
+
+
+class ServiceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def touch_client():
+    global LAST_CLIENT
+    LAST_CLIENT = time.monotonic()
+
+
+def next_refresh_in():
+    checked = [float(c.get("checked_ts", 0)) for c in load_all_caches().values() if c]
+    if len(checked) < len(FEEDS):
+        return REFRESH_MIN_SLEEP
+    return max(REFRESH_MIN_SLEEP, min(checked) + FEED_TTL - time.time())
+
+
+def refresh_loop(server):
+    # The whole desktop shares this one schedule: every feed is checked once per TTL, but only
+    # while clients are around and not on battery, a metered link or a locked screen. Requests
+    # with refresh="stale"/"force" still fetch on demand in between.
+    from vn_power import pause_reason
+
+    while True:
+        idle = time.monotonic() - LAST_CLIENT
+        if idle > SERVICE_IDLE_EXIT:
+            server.shutdown()
+            return
+        if idle > CLIENT_IDLE or pause_reason():
+            time.sleep(PAUSE_POLL)
+            continue
+        try:
+            fetch_all()
+            prefetch_articles()
+        except Exception:
+            pass
+        time.sleep(next_refresh_in())
+
+
+def serve():
+    if service_running():
+        return
+    os.makedirs(os.path.dirname(SOCKET_PATH), exist_ok=True)
+    try:
+        os.unlink(SOCKET_PATH)
+    except FileNotFoundError:
+        pass
+    server = ServiceServer(SOCKET_PATH, ServiceHandler)
+    os.chmod(SOCKET_PATH, 0o600)
+    threading.Thread(target=refresh_loop, args=(server,), daemon=True).start()
+    try:
+        server.serve_forever()
+    finally:
+        try:
+            os.unlink(SOCKET_PATH)
+        except OSError:
+            pass
+
+
+def main():
+    serve()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Is now a good time for background network work? Shared by the VN News service and panel.
+import os
+import subprocess
+
+
+def query(cmd):
+    try:
+        return subprocess.run(cmd, capture_output=True, text=True, timeout=2).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def read_sys(path, default=""):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+
+def on_battery():
+    base = "/sys/class/power_supply"
+    try:
+        names = os.listdir(base)
+    except OSError:
+        return False
+    discharging = False
+    for name in names:
+        path = os.path.join(base, name)
+        # Wireless mice and headsets are batteries too, with scope "Device"; only system supplies count.
+        if read_sys(os.path.join(path, "scope")) == "Device":
+            continue
+        if read_sys(os.path.join(path, "type")) == "Battery":
+            discharging = discharging or read_sys(os.path.join(path, "status")) == "Discharging"
+        elif read_sys(os.path.join(path, "online")) == "1":
+            return False
+    return discharging
+
+
+def metered():
+    # NetworkManager's NMMetered: 1 = yes, 3 = guessed yes.
+    out = query(
+        [
+            "busctl",
+            "get-property",
+            "org.freedesktop.NetworkManager",
+            "/org/freedesktop/NetworkManager",
+            "org.freedesktop.NetworkManager",
+            "Metered",
+        ]
+    )
+    return out in ("u 1", "u 3")
+
+
+def screen_locked():
+    session = os.environ.get("XDG_SESSION_ID") or "auto"
+    return query(["loginctl", "show-session", session, "-p", "LockedHint", "--value"]) == "yes"
+
+
+def pause_reason():
+    if on_battery():
+        return "battery"
+    if metered():
+        return "metered"
+    if screen_locked():
+        return "locked"
+    return ""
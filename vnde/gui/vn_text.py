@@ -0,0 +1,9 @@
+# Text helpers shared by the VNDE apps (forum search, news filter).
+import unicodedata
+
+
+def fold_text(text):
+    # "Tin tức Đà Nẵng" -> "tin tuc da nang": strip tone marks and fold đ to d.
+    decomposed = unicodedata.normalize("NFD", str(text or ""))
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return stripped.replace("đ", "d").replace("Đ", "D").lower()